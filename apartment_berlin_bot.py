@@ -1,42 +1,119 @@
-import collections
 import logging
 import os
-import re
-from datetime import datetime
+import time
 
 from dotenv import load_dotenv
-from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 
-from common.common_util import sleep, send_success_message, init_logger, is_page_contains_text, click_by_xpath, \
-    get_wait_time
-from common.custom_webdriver import WebDriver
+from common.browser_pool import BrowserPool
+from common.calendar_index import preferences_from_env, extract_bookable_days
+from common.common_util import sleep, send_success_message, claim_slot, init_logger, click_by_xpath, get_wait_time
+from common.coordination import default_coordinator
+from common.custom_webdriver import WebDriver, record_page_load
+from common.http_probe import CalendarProbe
+from common.event_store import record_probe
+from common.handoff import Handoff, handoff_enabled
+from common.sound import default_alarm
+from common.metrics import timed, record_outcome, record_restart, start_metrics
+from common.release_analytics import PollingSchedule
+from common.rate_limit import default_governor
+from common.page_state import PageState, apartment_classifier, SELECT_DATE, WAIT_TIME_EXPIRED
+from common.state_machine import State, StateMachine
+from common.supervisor import Supervisor, RestartRequired, CLEAR_STATE
 
-page_url = "https://service.berlin.de/dienstleistung/120686"
 bot_name = "apartment_berlin_bot"
 success_message = ("💚possible BERLIN APARTMENT appointment found. Please hurry to book your appointment by selecting "
                    "first available time.")
-time_message = """00:00 Minuten"""
-date_pattern = re.compile(r'\d{2}\.\d{2}\.\d{4}')
+probe_outcomes = {PageState.NO_APPOINTMENTS: 'no_slots', PageState.TOO_MANY_HITS: 'too_many_hits',
+                  PageState.SERVER_ERROR: 'error', PageState.ERROR: 'error'}
 
 
-def print_available_dates(links):
-    result_string = ""
-    for link in links:
-        date_match = date_pattern.search(link.accessible_name)
-        if date_match:
-            date_str = date_match.group()
-            result_string += date_str + ", "
-    logging.log(35, "Available dates found: %s", result_string)
+def record(outcome):
+    record_outcome(outcome)
+    record_probe("APT", outcome)
+
+
+def page_url():
+    # read on use, .env is only loaded once the process started
+    return os.environ.get("APT_PAGE_URL", "https://service.berlin.de/dienstleistung/120686")
+
+
+def wait_for_slot_over_http(url):
+    probe = CalendarProbe(url)
+    preferences = preferences_from_env() if bool(os.environ.get("APT_DATE_RANGE_ENABLED")) else None
+    schedule = PollingSchedule(profile="APT", min_interval=float(os.environ.get("APT_HTTP_PROBE_INTERVAL", "20")))
+    rounds = 0
+    try:
+        while True:
+            rounds = rounds + 1
+            try:
+                default_governor().acquire('wait_for_slot_over_http')
+                result = probe.probe()
+            except Exception as ex:
+                logging.warning("HTTP probe failed, reason= %s", ex)
+                sleep(10, 'wait_for_slot_over_http')
+                continue
+
+            dates = result.dates
+            if preferences:
+                dates = [d for d in dates if preferences.matches(d.date)]
+            logging.info("HTTP probe round # %d: state=%s, dates=%d, matching=%d, not_modified=%s, bytes=%d",
+                         rounds, result.state.name, len(result.dates), len(dates), result.not_modified, result.size)
+            if not dates and result.state in probe_outcomes and not result.not_modified:
+                record(probe_outcomes[result.state])
+            if dates:
+                record('http_probe_match')
+                logging.log(35, "HTTP probe found: %s", dates)
+                return dates
+            if result.state is PageState.TOO_MANY_HITS:
+                # the governor cooldown delays the next probe
+                default_governor().on_penalty('wait_for_slot_over_http')
+            else:
+                default_governor().on_success()
+                sleep(schedule.interval_at(), 'wait_for_slot_over_http')
+    finally:
+        probe.close()
+
+
+def pick_best_day(driver):
+    days = extract_bookable_days(driver)
+    if not days:
+        # the date range check already opened a day
+        return None
+    preferences = preferences_from_env() if bool(os.environ.get("APT_DATE_RANGE_ENABLED")) else None
+    best = preferences.best(days) if preferences else min(days, key=lambda slot: slot["day"])
+    if best is None:
+        return None
+    driver.execute_script("arguments[0].click();", best["element"])
+    return best["label"]
 
 
 class BerlinBot:
-    def __init__(self, url):
+    def __init__(self, url, pool=None):
+        self._started_at = time.monotonic()
         self._url = url
-        self._driver = WebDriver(bot_name).__enter__()
-        self._bot_name = bot_name
+        self._pool = pool
+        if pool:
+            self._driver = pool.acquire()
+        else:
+            self._driver = WebDriver(bot_name).__enter__()
+        default_governor().acquire('__init__')
         self._driver.get(self._url)
+        self._bot_name = bot_name
+        self._preferences = None
+        self._page = None
+        self.handoff = Handoff(bot_name, pick_best_day) if handoff_enabled() else None
         self._driver.minimize_window()
+        self.machine = StateMachine(bot_name, [
+            State("start_page", self.enter_start_page, {"entered": "calendar"}),
+            # an unknown page is looked at again for a while; a calendar refreshed because all its dates were out
+            # of range is looked at again too, but that is progress
+            State("calendar", self.check_calendar, {"found": "found", "no_slots": "next", "refreshed": "calendar",
+                                                    "unknown": "calendar"},
+                  deadline=60, retries=30, progress=("refreshed",)),
+            State("next", self.wait_and_click_next, {"next": "calendar"}),
+            State("found"),
+        ])
 
     def find_appointment_indefinitely(self):
         rounds = 0
@@ -49,29 +126,44 @@ class BerlinBot:
         self._driver.minimize_window()
         logging.info("Round - # %d, SessionId=%s", rounds, self._driver.session_id)
         try:
-            self.enter_start_page()
-
-            # retry submit
-            while True:
-                if self.is_success():
-                    send_success_message(self._driver, bot_name, success_message)
-                    break
-
-                if self.is_error_message("Zu viele Zugriffe"):
-                    logging.warning("Too many hits, restarting..")
-                    raise
-                elif is_page_contains_text(self._driver, "keine Termine"):
-                    logging.warning("Got message - No appointment found, retrying..")
-                    self.wait_and_click_next()
-                elif is_page_contains_text(self._driver, "Bitte entschuldigen Sie den Fehler"):
-                    raise Exception("Server error, retrying..")
+            self.machine.run("start_page")
         except Exception as ex:
             logging.warning(ex)
             raise
 
-    def is_success(self):
-        if (bool(os.environ.get("APT_DATE_RANGE_ENABLED"))
-                and is_page_contains_text(self._driver, "Bitte wählen Sie ein Datum:")):
+    def check_calendar(self):
+        page = apartment_classifier.snapshot(self._driver)
+        self._page = page
+        if self.is_success(page):
+            if not claim_slot("apt"):
+                # another node books this one, keep searching in a new round
+                raise RestartRequired("Slot already reported by another node")
+            record('success')
+            send_success_message(self._driver, bot_name, success_message, handoff=self.handoff)
+            return "found"
+        if bool(os.environ.get("APT_DATE_RANGE_ENABLED")) and page.contains(SELECT_DATE):
+            # is_success refreshed the calendar, none of its dates was in range
+            return "refreshed"
+
+        if page.state is PageState.TOO_MANY_HITS:
+            logging.warning("Too many hits, restarting..")
+            record('too_many_hits')
+            default_governor().on_penalty('find_appointment')
+            raise RestartRequired("Too many hits", CLEAR_STATE)
+        elif page.state is PageState.NO_APPOINTMENTS:
+            logging.warning("Got message - No appointment found, retrying..")
+            record('no_slots')
+            default_governor().on_success()
+            return "no_slots"
+        elif page.state in (PageState.ERROR, PageState.SERVER_ERROR):
+            record('error')
+            raise RestartRequired("Server error, retrying..")
+        sleep(1, 'check_calendar')
+        return "unknown"
+
+    @timed('is_success')
+    def is_success(self, page):
+        if bool(os.environ.get("APT_DATE_RANGE_ENABLED")) and page.contains(SELECT_DATE):
             if not self.expected_date_range_found():
                 sleep(10, 'is_success')
                 self.restart()
@@ -80,25 +172,32 @@ class BerlinBot:
             else:
                 return True
         else:
-            return (is_page_contains_text(self._driver, "Terminvereinbarung")
-                    and is_page_contains_text(self._driver, "Bitte wählen Sie ein Datum:"))
+            return page.state is PageState.SUCCESS
 
     def restart(self):
+        default_governor().acquire('restart')
         self._driver.refresh()
         self.enter_start_page()
 
+    @timed('enter_start_page')
     def enter_start_page(self):
+        default_governor().acquire('enter_start_page')
         click_by_xpath(self._driver, "Berlinweite Terminbuchung",
                        By.XPATH, "//*[contains(text(), 'Berlinweite Terminbuchung')]")
         sleep(2, 'enter_start_page')
+        record_page_load(self._driver, 'enter_start_page')
+        self.report_restart_time()
+        return "entered"
 
+    @timed('wait_and_click_next')
     def wait_and_click_next(self):
-        if is_page_contains_text(self._driver, time_message):
+        if self._page.contains(WAIT_TIME_EXPIRED):
             self._driver.back()
 
         try:
             time_to_wait_in_sec = get_wait_time(self._driver, By.XPATH, "//*[@id='calculatedSecs']")
             if time_to_wait_in_sec == 0:
+                default_governor().acquire('wait_and_click_next')
                 click_by_xpath(self._driver, "Terminsuche wiederholen button",
                                By.XPATH, "//button[text()='Terminsuche wiederholen']")
             elif time_to_wait_in_sec == -1:
@@ -108,45 +207,50 @@ class BerlinBot:
                 sleep(time_to_wait_in_sec, 'wait_and_click_next')
         except Exception as ex:
             logging.warning(ex)
+        return "next"
+
+    @property
+    def driver(self):
+        return self._driver
+
+    @property
+    def start_url(self):
+        return self._url
+
+    @property
+    def ready(self):
+        return self._started_at is None
+
+    def run(self):
+        self.find_appointment_indefinitely()
+
+    def restarted(self, tier=None):
+        self._started_at = time.monotonic()
+
+    def report_restart_time(self):
+        if self._started_at is not None:
+            logging.info("Restart to first form fill: %.2f sec", time.monotonic() - self._started_at)
+            self._started_at = None
 
     def close(self, message):
         logging.exception("Close due to error= {0}".format(message))
-        self._driver.quit()
-
-    def is_error_message(self, message):
-        try:
-            return self._driver.find_element(By.XPATH,
-                                             '//*[@id="messagesBox"]/ul/li[contains(text(), "' + message + '")]')
-        except NoSuchElementException as exception:
-            return False
+        logging.info("State dwell times: %s", self.machine.summary())
+        record_restart(bot_name)
+        if self._pool:
+            self._pool.release(self._driver)
+        else:
+            self._driver.quit()
 
     def expected_date_range_found(self):
-        # Define the date range
-        start = "21.06.2024"
-        #start = get_next_date()
-        end = os.environ.get("APT_DATE_RANGE_END")
-        start_date = datetime.strptime(start, "%d.%m.%Y")
-        end_date = datetime.strptime(end, "%d.%m.%Y")
-
-        # Find all available dates
-        links = self._driver.find_elements(By.CSS_SELECTOR, 'td.buchbar > a')
-        print_available_dates(links)
-        found_list = {}
-
-        for link in links:
-            aria_label = link.get_attribute('aria-label')
-            if aria_label:
-                date_match = date_pattern.search(aria_label)
-                if date_match:
-                    date_str = date_match.group()
-                    date_obj = datetime.strptime(date_str, "%d.%m.%Y")
-                    if start_date <= date_obj <= end_date:
-                        found_list[aria_label] = link
-
-        if len(found_list) > 0:
-            logging.log(35, "FOUND : %s", found_list.keys())
-            sorted_dates = collections.OrderedDict(sorted(found_list.items()))
-            next(iter(sorted_dates.values())).click()
+        # Find all available dates in one round trip and pick the earliest preferred one
+        if self._preferences is None:
+            self._preferences = preferences_from_env()
+            logging.info("Date preferences: %s", self._preferences)
+        best = self._preferences.best(extract_bookable_days(self._driver))
+
+        if best:
+            logging.log(35, "FOUND : %s", best["label"])
+            self._driver.execute_script("arguments[0].click();", best["element"])
             actual_dates_found = self._driver.find_elements(By.CSS_SELECTOR, 'th.buchbar')
             logging.log(35, "actual_dates_found : %s", actual_dates_found)
             if len(actual_dates_found) == 0:
@@ -157,12 +261,18 @@ class BerlinBot:
 
 
 if __name__ == "__main__":
+    load_dotenv()
+    init_logger('APT')
+    start_metrics()
+    default_alarm()  # decode the alarm clip before it is needed
+    url = page_url()
+    http_probe_enabled = bool(os.environ.get("APT_HTTP_PROBE_ENABLED"))
+    browser_pool = None if http_probe_enabled else BrowserPool(bot_name).start()
+    supervisor = Supervisor(bot_name, lambda: BerlinBot(url, browser_pool),
+                            lease=default_coordinator().lease("apt"))
     while True:
-        berlin_bot = BerlinBot(page_url)
-        try:
-            #sys.tracebacklimit = 0
-            load_dotenv()
-            init_logger('APT')
-            berlin_bot.find_appointment_indefinitely()
-        except BaseException as e:
-            berlin_bot.close(str(e))
+        if http_probe_enabled:
+            # only pay for a browser once a matching slot shows up
+            wait_for_slot_over_http(url)
+        # back to HTTP probing whenever the browser has to be given up
+        supervisor.run(until_relaunch=True)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common.emulator import EmulatorConfig, start_emulator, lea_start_path, apt_start_path, default_visa_categories
+
+bots = {
+    "lea": ("lea_berlin_bot.py", "LEA_PAGE_URL", lea_start_path),
+    "apt": ("apartment_berlin_bot.py", "APT_PAGE_URL", apt_start_path),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def bot_environment(bot, base_url, config, network_events=False):
+    script, url_variable, start_path = bots[bot]
+    category = next(iter(default_visa_categories))
+    sub_category = next(iter(default_visa_categories[category]))
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    env = dict(os.environ)
+    # keep the run away from the real event history, alarm and metrics endpoint
+    env.update({
+        url_variable: base_url + start_path,
+        "TELEGRAM_API_URL": base_url,
+        "TELEGRAM_API_TOKEN": "benchmark",
+        "TELEGRAM_CHAT_ID": "0",
+        "RATE_LIMIT_STATE_FILE": os.path.join(work_dir, "rate_limit.json"),
+        "EVENT_STORE_FILE": os.path.join(work_dir, "events.jsonl"),
+        "SOUND_BACKEND": "null",
+        "METRICS_PORT": "",
+        # leases, claims and cooldowns of the emulator must not reach bots running against the live site
+        "COORDINATION_URL": "sqlite:///" + os.path.join(work_dir, "coordination.db"),
+        "APT_DATE_RANGE_END": config.apt_slot_date,
+    })
+    if network_events:
+        env.update({"BROWSER_NETWORK_EVENTS": "true", "BROWSER_HEADLESS": "true"})
+    env.setdefault("LEA_NATIONALITY", "Indien")
+    env.setdefault("LEA_NUMBER_OF_PERSON", "eine Person")
+    env.setdefault("LEA_LIVING_IN_BERLIN", "nein")
+    env.setdefault("LEA_NATIONALITY_OF_FAMILY_MEMBERS", "Indien")
+    env.setdefault("LEA_VISA_CATEGORY", category)
+    env.setdefault("LEA_VISA_SUB_CATEGORY", sub_category)
+    env.setdefault("LEA_VISA_TYPE", default_visa_categories[category][sub_category][0])
+    return script, env
+
+
+def run(bot, config, duration, network_events=False):
+    server = start_emulator(config)
+    base_url = "http://127.0.0.1:{0}".format(server.server_address[1])
+    script, env = bot_environment(bot, base_url, config, network_events)
+    logging.info("Running %s against %s for at most %d sec", script, base_url, duration)
+    process = subprocess.Popen([sys.executable, script], env=env)
+    deadline = time.time() + duration
+    try:
+        while time.time() < deadline and process.poll() is None:
+            if server.state.stats()["time_to_detect"] is not None:
+                break
+            time.sleep(1)
+    finally:
+        process.terminate()
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stats = server.state.stats()
+        server.shutdown()
+    return stats
+
+
+def compare(previous, current):
+    for key in ("time_to_detect", "checks_per_minute", "restarts_per_hour"):
+        before, after = previous.get(key), current.get(key)
+        if before is None or after is None:
+            logging.info("%-18s %s -> %s", key, before, after)
+        else:
+            logging.info("%-18s %.2f -> %.2f (%+.2f)", key, before, after, after - before)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Time-to-detect benchmark against the local emulator")
+    parser.add_argument("bot", choices=sorted(bots))
+    parser.add_argument("--duration", type=int, default=600, help="give up after this many seconds")
+    parser.add_argument("--slot-at", type=float, default=120.0, help="seconds until the emulator publishes a slot")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--p-too-many-hits", type=float, default=0.0)
+    parser.add_argument("--p-server-error", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--network-events", action="store_true",
+                        help="headless Chrome, submit answers classified from the network")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", default="benchmark_results.jsonl")
+    args = parser.parse_args()
+
+    emulator_config = EmulatorConfig(latency=args.latency, slot_at=args.slot_at,
+                                     p_too_many_hits=args.p_too_many_hits, p_server_error=args.p_server_error,
+                                     seed=args.seed)
+    result = run(args.bot, emulator_config, args.duration, args.network_events)
+    result.update({"bot": args.bot, "label": args.label, "revision": git_revision(),
+                   "date": datetime.now().isoformat(timespec="seconds"), "config": emulator_config.__dict__})
+    logging.info("Result: %s", json.dumps(result))
+
+    previous_results = []
+    if os.path.exists(args.output):
+        with open(args.output, encoding="utf-8") as f:
+            previous_results = [json.loads(line) for line in f if line.strip()]
+    previous_results = [r for r in previous_results if r.get("bot") == args.bot]
+    if previous_results:
+        logging.info("Compared to previous run %s (%s):", previous_results[-1].get("revision"),
+                     previous_results[-1].get("label"))
+        compare(previous_results[-1], result)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
@@ -0,0 +1,96 @@
+# browser_pool.py
+import logging
+import os
+import queue
+import threading
+import time
+
+from common.custom_webdriver import WebDriver
+
+
+class BrowserPool:
+    """
+    Keeps pre-launched, pre-configured Chrome instances warm in the background.
+
+    acquire() hands over a warm driver immediately (falling back to a cold launch when the pool is empty) and
+    schedules a replacement; release() quits the old driver on a background thread so a restart never waits on
+    browser teardown. The start page is left to the bot: a standby driver waits for minutes, a page loaded
+    before that would be stale by the time it is handed over.
+    """
+
+    def __init__(self, bot_name, size=None, start_headless=None):
+        self._bot_name = bot_name
+        self._size = size if size is not None else int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+        self._headless = start_headless
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self.warm_hits = 0
+        self.cold_launches = 0
+
+    def start(self):
+        for _ in range(self._size):
+            self._refill()
+        return self
+
+    def acquire(self):
+        try:
+            driver = self._ready.get_nowait()
+            self.warm_hits = self.warm_hits + 1
+            logging.info("Browser pool: warm driver handed over, SessionId=%s", driver.session_id)
+        except queue.Empty:
+            logging.info("Browser pool: no warm driver available, cold launch")
+            driver = self._launch()
+            self.cold_launches = self.cold_launches + 1
+        self._refill()
+        return driver
+
+    def release(self, driver):
+        if driver is None:
+            return
+        threading.Thread(target=self._quit, args=(driver,), name="browser-pool-quit", daemon=True).start()
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._quit(self._ready.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {"warm_hits": self.warm_hits, "cold_launches": self.cold_launches, "ready": self._ready.qsize()}
+
+    def _refill(self):
+        with self._lock:
+            if self._closed or self._ready.qsize() + self._pending >= self._size:
+                return
+            self._pending = self._pending + 1
+        threading.Thread(target=self._warm_up, name="browser-pool-warm-up", daemon=True).start()
+
+    def _warm_up(self):
+        try:
+            driver = self._launch()
+            if self._closed:
+                self._quit(driver)
+            else:
+                self._ready.put(driver)
+        except Exception as ex:
+            logging.warning("Browser pool: failed to warm up driver, reason= %s", ex)
+        finally:
+            with self._lock:
+                self._pending = self._pending - 1
+
+    def _launch(self):
+        started = time.monotonic()
+        driver = WebDriver(self._bot_name, self._headless).__enter__()
+        logging.info("Browser pool: driver launched in %.2f sec", time.monotonic() - started)
+        return driver
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as ex:
+            logging.warning("Browser pool: failed to quit driver, reason= %s", ex)
@@ -0,0 +1,98 @@
+# calendar_index.py
+import bisect
+import logging
+import os
+from datetime import datetime, timedelta
+
+date_format = "%d.%m.%Y"
+weekday_names = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# Returns every bookable calendar day in one round trip: date text, link, id and the element itself.
+_EXTRACT_BOOKABLE_JS = """
+var pattern = /\\d{2}\\.\\d{2}\\.\\d{4}/;
+return Array.prototype.map.call(document.querySelectorAll(arguments[0]), function (a, index) {
+    var label = a.getAttribute('aria-label') || a.getAttribute('title') || a.textContent || '';
+    var match = label.match(pattern);
+    return {index: index, date: match ? match[0] : null, label: label.trim(), href: a.getAttribute('href'),
+            id: a.id || null, element: a};
+});
+"""
+
+
+def parse_date(value):
+    return datetime.strptime(value.strip(), date_format).date()
+
+
+class DatePreferences:
+    """
+    Preferred booking days: any number of date windows plus optional weekday filter and blackout dates.
+
+    Windows are merged into a sorted, non-overlapping interval index, so matching a day is one bisect.
+    """
+
+    def __init__(self, windows, weekdays=None, blackout_dates=()):
+        merged = []
+        for start, end in sorted(windows):
+            if merged and start <= merged[-1][1] + timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+        self._weekdays = frozenset(weekdays) if weekdays else None
+        self._blackout = frozenset(blackout_dates)
+
+    def matches(self, day):
+        if isinstance(day, datetime):
+            day = day.date()
+        if day in self._blackout:
+            return False
+        if self._weekdays is not None and day.weekday() not in self._weekdays:
+            return False
+        i = bisect.bisect_right(self._starts, day) - 1
+        return i >= 0 and day <= self._ends[i]
+
+    def best(self, slots, key=lambda slot: slot["day"]):
+        matching = [slot for slot in slots if self.matches(key(slot))]
+        return min(matching, key=key) if matching else None
+
+    def __repr__(self):
+        windows = ", ".join("{0}-{1}".format(s.strftime(date_format), e.strftime(date_format))
+                            for s, e in zip(self._starts, self._ends))
+        return "DatePreferences(windows=[{0}], weekdays={1}, blackout={2})".format(
+            windows, sorted(self._weekdays) if self._weekdays is not None else "any", len(self._blackout))
+
+
+def _parse_weekday(value):
+    value = value.strip().lower()
+    if value.isdigit():
+        return int(value) % 7
+    return weekday_names.index(value[:3])
+
+
+def preferences_from_env():
+    """
+    APT_DATE_WINDOWS="01.07.2024-15.07.2024,22.07.2024-31.07.2024", APT_WEEKDAYS="mon,tue,fri" and
+    APT_BLACKOUT_DATES="03.07.2024". Without APT_DATE_WINDOWS the old single APT_DATE_RANGE_START (default
+    21.06.2024) .. APT_DATE_RANGE_END window is used.
+    """
+    windows = []
+    for window in filter(None, os.environ.get("APT_DATE_WINDOWS", "").split(",")):
+        start, _, end = window.partition("-")
+        windows.append((parse_date(start), parse_date(end or start)))
+    if not windows:
+        windows.append((parse_date(os.environ.get("APT_DATE_RANGE_START", "21.06.2024")),
+                        parse_date(os.environ.get("APT_DATE_RANGE_END"))))
+    weekdays = [_parse_weekday(d) for d in filter(None, os.environ.get("APT_WEEKDAYS", "").split(","))]
+    blackout = [parse_date(d) for d in filter(None, os.environ.get("APT_BLACKOUT_DATES", "").split(","))]
+    return DatePreferences(windows, weekdays or None, blackout)
+
+
+def extract_bookable_days(driver, selector='td.buchbar > a'):
+    slots = []
+    for link in driver.execute_script(_EXTRACT_BOOKABLE_JS, selector) or []:
+        if link.get("date"):
+            link["day"] = parse_date(link["date"])
+            slots.append(link)
+    logging.log(35, "Available dates found: %s", ", ".join(slot["date"] for slot in slots))
+    return slots
@@ -0,0 +1,130 @@
+# clock.py
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support.wait import WebDriverWait
+
+
+class RealClock:
+    """Wall clock time, sleeps block the calling thread."""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds))
+
+    def wait(self, driver, timeout, poll_frequency=0.5):
+        return WebDriverWait(driver, timeout, poll_frequency)
+
+
+class VirtualClock:
+    """
+    Simulated time that only moves when someone sleeps: sleep() returns immediately and advances the clock,
+    firing the callbacks scheduled with call_at() on the way. Meant for scripted runs of the polling,
+    scheduling and backoff logic, a day of polling takes seconds.
+
+    Callbacks run on the sleeping thread; an exception raised by one ends that sleep, which is how a
+    simulation is stopped.
+    """
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+        self._timers = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.slept = 0.0
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def monotonic(self):
+        return self.time()
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds):
+        with self._lock:
+            target = self._now + max(0.0, seconds)
+            self.slept = self.slept + max(0.0, seconds)
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > target:
+                    self._now = max(self._now, target)
+                    return
+                when, _, callback = heapq.heappop(self._timers)
+                self._now = max(self._now, when)
+            callback()
+
+    def call_at(self, when, callback):
+        with self._lock:
+            heapq.heappush(self._timers, (when, next(self._sequence), callback))
+
+    def call_later(self, delay, callback):
+        self.call_at(self.time() + delay, callback)
+
+    def wait(self, driver, timeout, poll_frequency=0.5):
+        return VirtualWait(self, driver, timeout, poll_frequency)
+
+
+class VirtualWait:
+    """WebDriverWait counterpart that polls on a VirtualClock."""
+
+    def __init__(self, clock, driver, timeout, poll_frequency=0.5, ignored_exceptions=(NoSuchElementException,)):
+        self._clock = clock
+        self._driver = driver
+        self._timeout = timeout
+        self._poll_frequency = poll_frequency
+        self._ignored_exceptions = ignored_exceptions
+
+    def until(self, method, message=''):
+        return self._poll(lambda value: value, method, message)
+
+    def until_not(self, method, message=''):
+        # like WebDriverWait, an element that is gone counts as "not"
+        return self._poll(lambda value: not value, method, message, ignored_result=True)
+
+    def _poll(self, accept, method, message, ignored_result=None):
+        end = self._clock.monotonic() + self._timeout
+        while True:
+            try:
+                value = method(self._driver)
+                if accept(value):
+                    return value
+            except self._ignored_exceptions:
+                if ignored_result is not None:
+                    return ignored_result
+            if self._clock.monotonic() > end:
+                raise TimeoutException(message)
+            self._clock.sleep(self._poll_frequency)
+
+
+_default_clock = RealClock()
+_default_lock = threading.Lock()
+
+
+def default_clock():
+    with _default_lock:
+        return _default_clock
+
+
+def set_default_clock(clock):
+    """Replaces the clock used by sleeps, page waits and retry loops; returns the previous one."""
+    global _default_clock
+    with _default_lock:
+        previous, _default_clock = _default_clock, clock
+    logging.info("Clock: %s", type(clock).__name__)
+    return previous
@@ -10,17 +10,17 @@ from selenium.webdriver.chrome import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.select import Select
-from selenium.webdriver.support.wait import WebDriverWait
 
-from common import notifier, sound
-
-_sound_file = os.path.join(os.getcwd(), "alarm.wav")
-path = os.path.expanduser('~') + '/Downloads/'
+from common import sound
+from common.clock import default_clock
+from common.coordination import default_coordinator
+from common.custom_webdriver import restore_full_rendering
+from common.screenshot import default_pipeline, capture_png
 
 
 def sleep(seconds=2, context=''):
     logging.info("%s : Sleep %d seconds", context, seconds)
-    time.sleep(seconds)
+    default_clock().sleep(seconds)
 
 
 def is_page_contains_text(driver, text):
@@ -53,7 +53,7 @@ def click_by_xpath(driver: webdriver.WebDriver, element_name, selector_type, sel
             logging.info("Try Clicking on: %s", element_name)
             elements = driver.find_elements(selector_type, selector)
             for element in elements:
-                WebDriverWait(driver, 60).until(
+                default_clock().wait(driver, 60).until(
                     EC.element_to_be_clickable((selector_type, selector)))
                 driver.execute_script("arguments[0].click();", element)
             break
@@ -73,16 +73,30 @@ def select_dropdown(driver: webdriver.WebDriver, selector_type, selector, value)
             logging.warning("%s, retry=%d (%s)", str(exception.__cause__), i, value)
 
 
-def send_success_message(driver, bot_name, message, wait=300):
+def claim_slot(claim, wait=300):
+    """False when another node reported `claim` first; it is booking, so this one stays out of its way for `wait`."""
+    if default_coordinator().claim(claim):
+        return True
+    sleep(wait, 'claim_slot')
+    return False
+
+
+def send_success_message(driver, bot_name, message, wait=300, handoff=None):
+    detected_at = time.time()
     logging.info("!!!SUCCESS - do not close the window!!!!")
+    restore_full_rendering(driver)
     driver.maximize_window()
-    save_screenshot(driver, bot_name)
-    # notifier.send_to_telegram(termin_name + ' : '+message)
-    for _ in range(3):
-        notifier.send_photo_to_telegram(message, photo_path=path + bot_name + '_' + driver.session_id + '.png')
+    if handoff:
+        # pick the slot before the screenshot, so it shows what the human takes over
+        message = message + "\n" + handoff.prepare(driver, detected_at)
+    # only the capture runs here, resizing, archiving and delivery happen on background threads
+    default_pipeline().notify(driver, message, key=bot_name + '_' + driver.session_id, detected_at=detected_at)
     while True:
-        sound.play_sound_osx(_sound_file)
-        sleep(wait)
+        sound.default_alarm().play()
+        if handoff:
+            handoff.hold(driver, wait)
+        else:
+            sleep(wait)
 
 
 def send_error_message(driver, bot_name, message, wait=300):
@@ -105,23 +119,21 @@ def get_page_source(driver):
             return driver.page_source
 
 
-def save_screenshot(driver, bot_name):
+def save_screenshot(driver, bot_name, directory=None):
+    directory = directory or os.environ.get("SCREENSHOT_DIR") or os.getcwd()
+    file_name = os.path.join(directory, bot_name + '_' + driver.session_id + '.png')
     try:
-        WebDriverWait(driver, 10).until(
-            lambda d: d.find_element(By.TAG_NAME, 'body').size['height'] > 0
-        )
-
-        element = WebDriverWait(driver, 10).until(
-            lambda d: d.find_element(By.TAG_NAME, 'body')
-        )
-        element.screenshot(path + bot_name + '_' + driver.session_id + '.png')
+        with open(file_name, 'wb') as f:
+            f.write(capture_png(driver))
+        return file_name
     except Exception as ex:
         logging.warning(ex)
-        pass
 
 
-def init_logger(default_name):
+def init_logger(default_name, show_thread=False):
     name = get_bot_name(default_name)
+    if show_thread:
+        name = name + ' [%(threadName)s]'
     logging.addLevelName(35, "SUCCESS")
     if not os.getenv('COLOREDLOGS_LOG_FORMAT'):
         styles = dict(
@@ -149,15 +161,15 @@ def init_logger(default_name):
 
 def get_bot_name(default_name):
     pattern = re.compile(r'\(.+\)')
-    visa_sub_category = os.environ.get("LEA_VISA_TYPE")
-    if len(visa_sub_category) > 0:
+    visa_sub_category = os.environ.get("LEA_VISA_TYPE", "")
+    if len(visa_sub_category) > 0 and pattern.search(visa_sub_category):
         category = pattern.findall(visa_sub_category)[0]
         if not os.getenv('BOT_NAME'):
             return default_name + "|" + category
         return os.getenv('BOT_NAME') + category
     words = visa_sub_category.split()
     if not words:
-        return None  # Handle empty sentence
+        return default_name  # Handle empty sentence
     return words[-1]
 
 
@@ -169,10 +181,10 @@ def get_next_date(days_to_add=1):
     return next_day.strftime('%d.%m.%Y')
 
 
-def handle_unexpected_alert(driver):
+def handle_unexpected_alert(driver, timeout=10):
     try:
         # Wait for the alert to be present
-        WebDriverWait(driver, 10).until(EC.alert_is_present())
+        default_clock().wait(driver, timeout).until(EC.alert_is_present())
 
         # Switch to the alert
         alert = driver.switch_to.alert
@@ -194,7 +206,7 @@ def handle_unexpected_alert(driver):
 
 def get_wait_time(driver, selector_type, selector):
     try:
-        time_left = WebDriverWait(driver, 10).until(
+        time_left = default_clock().wait(driver, 10).until(
             lambda d: d.find_element(selector_type, selector)
         )
         if time_left.is_displayed():
@@ -0,0 +1,385 @@
+# coordination.py
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, unquote
+
+from common.metrics import registry
+
+claims_total = registry.counter("bot_coordination_claims_total", "Success claims by result")
+key_prefix = "berlin_termin_bot:"
+
+
+class MemoryBackend:
+    """In-process stand-in with the same semantics as the shared backends, for tests and single process runs."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] <= now:
+            del self._values[key]
+            return None
+        return entry
+
+    def set_if_absent(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            if self._live(key, now) is not None:
+                return False
+            self._values[key] = (value, now + ttl)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def delete_if_equals(self, key, value):
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None or entry[0] != value:
+                return False
+            del self._values[key]
+            return True
+
+    def expire_if_equals(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            if entry is None or entry[0] != value:
+                return False
+            self._values[key] = (value, now + ttl)
+            return True
+
+    def set_max(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            if entry is not None and float(entry[0]) >= value:
+                return False
+            self._values[key] = (str(value), now + ttl)
+            return True
+
+
+class SqliteBackend:
+    """Shared by every process on one host; each operation is one IMMEDIATE transaction."""
+
+    def __init__(self, path):
+        self._path = path
+        connection = self._connect()
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS coordination "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=10, isolation_level=None)
+
+    def _transaction(self, fn):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            result = fn(connection, now)
+            connection.execute("COMMIT")
+            return result
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _live(connection, key, now):
+        row = connection.execute("SELECT value, expires_at FROM coordination WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] <= now:
+            connection.execute("DELETE FROM coordination WHERE key = ?", (key,))
+            return None
+        return row
+
+    def _put(self, connection, key, value, expires_at):
+        connection.execute("INSERT OR REPLACE INTO coordination (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, value, expires_at))
+
+    def set_if_absent(self, key, value, ttl):
+        def fn(connection, now):
+            if self._live(connection, key, now) is not None:
+                return False
+            self._put(connection, key, value, now + ttl)
+            return True
+
+        return self._transaction(fn)
+
+    def get(self, key):
+        row = self._transaction(lambda connection, now: self._live(connection, key, now))
+        return row[0] if row else None
+
+    def delete_if_equals(self, key, value):
+        def fn(connection, now):
+            row = self._live(connection, key, now)
+            if row is None or row[0] != value:
+                return False
+            connection.execute("DELETE FROM coordination WHERE key = ?", (key,))
+            return True
+
+        return self._transaction(fn)
+
+    def expire_if_equals(self, key, value, ttl):
+        def fn(connection, now):
+            row = self._live(connection, key, now)
+            if row is None or row[0] != value:
+                return False
+            self._put(connection, key, value, now + ttl)
+            return True
+
+        return self._transaction(fn)
+
+    def set_max(self, key, value, ttl):
+        def fn(connection, now):
+            row = self._live(connection, key, now)
+            if row is not None and float(row[0]) >= value:
+                return False
+            self._put(connection, key, str(value), now + ttl)
+            return True
+
+        return self._transaction(fn)
+
+
+_compare_and_delete_lua = ("if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) "
+                           "else return 0 end")
+_compare_and_expire_lua = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                           "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end")
+_set_max_lua = ("local current = tonumber(redis.call('get', KEYS[1]) or '0') "
+                "if tonumber(ARGV[1]) > current then redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2]) return 1 end "
+                "return 0")
+
+
+class RespBackend:
+    """
+    Talks the Redis protocol (RESP) over a plain socket, so any Redis compatible server (Redis, Valkey, KeyDB)
+    shared by several machines works without an extra client library.
+    """
+
+    def __init__(self, host, port=6379, password=None, db=0, timeout=5.0):
+        self._address = (host, port)
+        self._password = password
+        self._db = db
+        self._timeout = timeout
+        self._socket = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._socket = socket.create_connection(self._address, self._timeout)
+        self._reader = self._socket.makefile("rb")
+        if self._password:
+            self._round_trip("AUTH", self._password)
+        if self._db:
+            self._round_trip("SELECT", self._db)
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def command(self, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._round_trip(*args)
+                except OSError:
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def _round_trip(self, *args):
+        encoded = [str(arg).encode("utf-8") for arg in args]
+        request = b"*%d\r\n" % len(encoded) + b"".join(b"$%d\r\n%s\r\n" % (len(a), a) for a in encoded)
+        self._socket.sendall(request)
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise RuntimeError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return self._reader.read(length + 2)[:-2].decode("utf-8")
+        if prefix == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError("Unexpected reply: {0!r}".format(line))
+
+    def set_if_absent(self, key, value, ttl):
+        return self.command("SET", key, value, "NX", "PX", int(ttl * 1000)) == "OK"
+
+    def get(self, key):
+        return self.command("GET", key)
+
+    def delete_if_equals(self, key, value):
+        return self.command("EVAL", _compare_and_delete_lua, 1, key, value) == 1
+
+    def expire_if_equals(self, key, value, ttl):
+        return self.command("EVAL", _compare_and_expire_lua, 1, key, value, int(ttl * 1000)) == 1
+
+    def set_max(self, key, value, ttl):
+        return self.command("EVAL", _set_max_lua, 1, key, repr(value), int(ttl * 1000)) == 1
+
+
+def backend_from_url(url):
+    """memory://, sqlite:///relative.db, sqlite:////absolute/path.db or redis://[:password@]host[:port][/db]"""
+    parts = urlsplit(url)
+    if parts.scheme == "memory":
+        return MemoryBackend()
+    if parts.scheme == "sqlite":
+        return SqliteBackend(unquote(parts.path[1:]))
+    if parts.scheme in ("redis", "resp"):
+        db = parts.path.strip("/")
+        return RespBackend(parts.hostname or "127.0.0.1", parts.port or 6379,
+                           unquote(parts.password) if parts.password else None, int(db) if db else 0)
+    raise ValueError("Unsupported coordination backend: " + url)
+
+
+class Lease:
+    """
+    Exclusive, expiring ownership of a name across all nodes sharing the backend. While held it is renewed
+    every ttl/3 on a background thread; a node that dies releases it by expiry.
+    """
+
+    def __init__(self, coordinator, name, ttl):
+        self._coordinator = coordinator
+        self._key = key_prefix + "lease:" + name
+        self.name = name
+        self._ttl = ttl
+        self._held = threading.Event()
+
+    @property
+    def held(self):
+        return self._held.is_set()
+
+    def holder(self):
+        return self._coordinator.call(self._coordinator.backend.get, None, self._key)
+
+    def try_acquire(self):
+        node = self._coordinator.node_id
+        acquired = self._coordinator.call(self._coordinator.backend.set_if_absent, True, self._key, node, self._ttl) \
+            or self.holder() == node
+        if acquired and not self.held:
+            self._held.set()
+            threading.Thread(target=self._renew, name="lease-" + self.name, daemon=True).start()
+            logging.info("Lease %s acquired by %s", self.name, node)
+        return acquired
+
+    def acquire(self):
+        waiting = False
+        while not self.try_acquire():
+            if not waiting:
+                logging.info("Lease %s held by %s, standing by", self.name, self.holder())
+                waiting = True
+            time.sleep(self._ttl / 2)
+        return self
+
+    def release(self):
+        if self.held:
+            self._held.clear()
+            self._coordinator.call(self._coordinator.backend.delete_if_equals, False, self._key,
+                                   self._coordinator.node_id)
+
+    def _renew(self):
+        while self.held:
+            time.sleep(self._ttl / 3)
+            if self.held and not self._coordinator.call(self._coordinator.backend.expire_if_equals, True, self._key,
+                                                        self._coordinator.node_id, self._ttl):
+                logging.warning("Lease %s lost", self.name)
+                self._held.clear()
+
+
+class Coordinator:
+    """
+    Coordinates bots on several processes or machines: per profile leases, first-finder-wins claims of
+    success events and a shared rate limit cooldown.
+
+    Every call fails open, an unreachable backend degrades to uncoordinated bots instead of stopping them.
+    """
+
+    def __init__(self, backend, node_id=None, lease_ttl=None, claim_window=None):
+        self.backend = backend
+        self.node_id = node_id or os.environ.get("NODE_ID") or "{0}-{1}".format(socket.gethostname(), os.getpid())
+        self._lease_ttl = lease_ttl if lease_ttl is not None else float(os.environ.get("COORDINATION_LEASE_TTL", "60"))
+        self._claim_window = claim_window if claim_window is not None else \
+            float(os.environ.get("COORDINATION_CLAIM_WINDOW", "900"))
+        self._cooldown = (0.0, 0.0)
+
+    def call(self, fn, fallback, *args):
+        try:
+            return fn(*args)
+        except Exception as ex:
+            logging.warning("Coordination backend unavailable, reason= %s", ex)
+            return fallback
+
+    def lease(self, name, ttl=None):
+        return Lease(self, name, ttl or self._lease_ttl)
+
+    def claim(self, event):
+        """True for the first node reporting `event` within the claim window, False for everyone after it."""
+        key = key_prefix + "claim:" + event
+        if self.call(self.backend.set_if_absent, True, key, self.node_id, self._claim_window):
+            claims_total.inc(result="won")
+            return True
+        holder = self.call(self.backend.get, None, key)
+        if holder == self.node_id:
+            return True
+        claims_total.inc(result="lost")
+        logging.warning("%s was already reported by %s", event, holder)
+        return False
+
+    def publish_cooldown(self, until):
+        ttl = until - time.time()
+        if ttl > 0:
+            self.call(self.backend.set_max, False, key_prefix + "cooldown", until, ttl)
+
+    def cooldown_until(self, max_age=1.0):
+        # cached briefly, every rate limited request asks
+        now = time.time()
+        if now - self._cooldown[1] > max_age:
+            value = self.call(self.backend.get, None, key_prefix + "cooldown")
+            self._cooldown = (float(value) if value else 0.0, now)
+        return self._cooldown[0]
+
+
+_default_coordinator = None
+_default_lock = threading.Lock()
+
+
+def default_coordinator():
+    global _default_coordinator
+    with _default_lock:
+        if _default_coordinator is None:
+            url = os.environ.get("COORDINATION_URL") or "sqlite:///" + os.path.join(
+                tempfile.gettempdir(), "berlin_termin_bot_coordination.db")
+            _default_coordinator = Coordinator(backend_from_url(url))
+            logging.info("Coordination via %s as %s", urlsplit(url).scheme, _default_coordinator.node_id)
+        return _default_coordinator
@@ -1,10 +1,95 @@
 # custom_webdriver.py
 import logging
+import os
+import tempfile
 
 from selenium import webdriver
 from selenium.webdriver import DesiredCapabilities
 
 from common import notifier
+from common.metrics import instrument_driver, registry
+
+# URL patterns per resource class for Network.setBlockedURLs
+blocked_url_patterns = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheet": ["*.css"],
+    "media": ["*.mp3", "*.mp4", "*.wav", "*.webm", "*.ogg"],
+    "analytics": ["*google-analytics.com*", "*googletagmanager.com*", "*matomo*", "*piwik*", "*etracker*"],
+}
+page_load_seconds = registry.histogram("bot_page_load_seconds", "Navigation duration reported by the browser")
+page_bytes_total = registry.counter("bot_page_bytes_total", "Bytes transferred for page loads and their resources")
+
+_page_load_js = """
+var navigation = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+return {
+    duration: navigation ? navigation.duration : 0,
+    bytes: (navigation ? navigation.transferSize : 0)
+        + resources.reduce(function (total, r) { return total + (r.transferSize || 0); }, 0),
+    resources: resources.length
+};
+"""
+
+
+def is_lean(driver):
+    return getattr(driver, "lean_mode", False)
+
+
+def record_page_load(driver, context=''):
+    """Records duration and bytes of the current page (document plus resources), labelled by lean mode."""
+    try:
+        stats = driver.execute_script(_page_load_js)
+    except Exception as ex:
+        logging.debug("page load stats not available, reason= %s", ex)
+        return None
+    lean = "true" if is_lean(driver) else "false"
+    page_load_seconds.observe(stats["duration"] / 1000, lean=lean)
+    page_bytes_total.inc(stats["bytes"], lean=lean)
+    logging.info("%s : page loaded in %.2f sec, %d bytes, %d resources, lean=%s", context, stats["duration"] / 1000,
+                 stats["bytes"], stats["resources"], lean)
+    return stats
+
+
+def restore_full_rendering(driver):
+    """Lifts the lean mode resource blocking so a human can take over the page."""
+    if not is_lean(driver):
+        return
+    try:
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": []})
+        driver.lean_mode = False
+        logging.info("Full rendering restored")
+        if getattr(driver, "headless", False):
+            logging.warning("Browser runs headless, the page cannot be shown on this screen")
+    except Exception as ex:
+        logging.warning("Failed to restore full rendering, reason= %s", ex)
+
+
+def configure_tab(driver, lean=False):
+    """Per tab DevTools setup: hides the webdriver flag, overrides the user agent and, in lean mode, blocks
+    resources. Needs to be repeated for every new tab."""
+    driver.execute_script(
+        "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    driver.execute_cdp_cmd('Network.setUserAgentOverride', {
+        "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                     'Chrome/83.0.4103.53 Safari/537.36'})
+    driver.lean_mode = False
+    if lean:
+        block_resources(driver)
+
+
+def block_resources(driver):
+    classes = [c.strip() for c in os.environ.get("BROWSER_BLOCKED_RESOURCES",
+                                                  "image,font,media,analytics").split(",") if c.strip()]
+    urls = [pattern for c in classes for pattern in blocked_url_patterns.get(c, [])]
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": urls})
+    driver.lean_mode = True
+    logging.info("Lean mode, blocking %s", classes)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes")
 
 
 def get_page_source(driver: webdriver.Chrome):
@@ -20,11 +105,13 @@ def get_page_source(driver: webdriver.Chrome):
 
 
 class WebDriver:
-    def __init__(self, bot_name, start_headless=False):
+    def __init__(self, bot_name, start_headless=None, lean=None):
         self._driver: webdriver.Chrome
         self._implicit_wait_time = 60
         self._bot_name = bot_name
-        self._headless = start_headless
+        self._lean = _env_flag("BROWSER_LEAN") if lean is None else lean
+        self._headless = (_env_flag("BROWSER_HEADLESS") or self._lean) if start_headless is None else start_headless
+        self._network_events = _env_flag("BROWSER_NETWORK_EVENTS")
 
     def __enter__(self) -> webdriver.Chrome:
         logging.info("Open browser")
@@ -32,24 +119,39 @@ class WebDriver:
         options = webdriver.ChromeOptions()
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.set_capability('unhandledPromptBehavior', 'accept')
+        # the page side waits run on timers, which Chrome would otherwise throttle in minimized windows and
+        # background tabs
+        options.add_argument('--disable-background-timer-throttling')
+        options.add_argument('--disable-renderer-backgrounding')
+        options.add_argument('--disable-backgrounding-occluded-windows')
         if self._headless:
-            options.add_argument('--headless')
+            options.add_argument('--headless=new')
+        if self._network_events:
+            # Network.* events in the performance log, read by NetworkDetector
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        if self._lean:
+            options.add_argument('--disable-gpu')
+            options.add_argument('--disable-extensions')
+            options.add_argument('--disk-cache-dir=' + os.environ.get(
+                "BROWSER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "berlin_termin_bot_cache")))
         #options.add_argument("--start-maximized")
         options.add_argument("--start-minimized")
         capabilities = DesiredCapabilities.CHROME.copy()
         capabilities['pageLoadStrategy'] = 'normal'
         capabilities['unexpectedAlertBehaviour'] = 'accept'
-        self._driver = webdriver.Chrome(options=options, desired_capabilities=capabilities)
+        self._driver = instrument_driver(webdriver.Chrome(options=options, desired_capabilities=capabilities))
         self._driver.implicitly_wait(10)  # seconds
         self._driver.set_page_load_timeout(60)  # seconds
-        self._driver.execute_script(
-            "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        self._driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-            "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                         'Chrome/83.0.4103.53 Safari/537.36'})
+        self._driver.headless = self._headless
+        self._driver.network_events = self._network_events
+        configure_tab(self._driver, self._lean)
         self._driver.minimize_window()
         return self._driver
 
+    def block_resources(self):
+        block_resources(self._driver)
+
     def __exit__(self, exc_type, exc_value, exc_tb):
         logging.info("Close browser")
         if exc_type is not None:
@@ -0,0 +1,185 @@
+# dispatcher.py
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Notification:
+    def __init__(self, message, photo=None, key=None, detected_at=None, on_delivered=None):
+        self.message = "" + str(os.getpid()) + " : " + message
+        self.photo = photo
+        self.key = key or hashlib.sha1(message.encode("utf-8")).hexdigest()
+        self.created_at = time.time()
+        self.detected_at = detected_at or self.created_at
+        self.on_delivered = on_delivered
+
+    def photo_name(self):
+        # photos are PNG as captured or JPEG after recompression
+        return "screenshot.jpg" if bytes(self.photo[:2]) == b"\xff\xd8" else "screenshot.png"
+
+
+def new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class TelegramSink:
+    name = "telegram"
+
+    def __init__(self, session, api_token, chat_id, api_url="https://api.telegram.org", timeout=20):
+        self._session = session
+        self._chat_id = chat_id
+        self._base_url = "{0}/bot{1}".format(api_url.rstrip("/"), api_token)
+        self._timeout = timeout
+
+    def send(self, notification):
+        if notification.photo is not None:
+            response = self._session.post(self._base_url + "/sendPhoto",
+                                          data={"chat_id": self._chat_id, "caption": notification.message},
+                                          files={"photo": (notification.photo_name(), notification.photo)},
+                                          timeout=self._timeout)
+        else:
+            response = self._session.post(self._base_url + "/sendMessage",
+                                          json={"chat_id": self._chat_id, "text": notification.message,
+                                                "parse_mode": "Markdown"},
+                                          timeout=self._timeout)
+        response.raise_for_status()
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, session, url, timeout=20):
+        self._session = session
+        self._url = url
+        self._timeout = timeout
+
+    def send(self, notification):
+        response = self._session.post(self._url, json={"message": notification.message, "key": notification.key,
+                                                       "created_at": notification.created_at,
+                                                       "has_photo": notification.photo is not None},
+                                      timeout=self._timeout)
+        response.raise_for_status()
+
+
+class FileSink:
+    name = "file"
+
+    def __init__(self, path):
+        self._path = path
+
+    def send(self, notification):
+        with open(self._path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"message": notification.message, "key": notification.key,
+                                "created_at": notification.created_at}, ensure_ascii=False) + "\n")
+
+
+class NotificationDispatcher:
+    """
+    Delivers notifications on background threads so detection never waits on the network.
+
+    notify() only checks the de-duplication window and enqueues; every sink has its own bounded queue and worker
+    thread, so a slow or failing sink retries with exponential backoff without holding up the others.
+    """
+
+    def __init__(self, sinks, maxsize=100, retries=5, backoff=1.0, max_backoff=60.0, dedup_window=300.0):
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._dedup_window = dedup_window
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._queues = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        for sink in sinks:
+            sink_queue = queue.Queue(maxsize)
+            self._queues.append(sink_queue)
+            threading.Thread(target=self._work, args=(sink, sink_queue), name="notify-" + sink.name,
+                             daemon=True).start()
+
+    def notify(self, message, photo=None, key=None, detected_at=None, on_delivered=None):
+        notification = Notification(message, photo, key, detected_at, on_delivered)
+        with self._lock:
+            last_sent = self._recent.get(notification.key)
+            if last_sent is not None and notification.created_at - last_sent < self._dedup_window:
+                return False
+            # keys outside the window can no longer suppress anything, a long run keeps only the recent ones
+            self._recent = {key: sent_at for key, sent_at in self._recent.items()
+                            if notification.created_at - sent_at < self._dedup_window}
+            self._recent[notification.key] = notification.created_at
+        for sink_queue in self._queues:
+            try:
+                sink_queue.put_nowait(notification)
+            except queue.Full:
+                self.dropped = self.dropped + 1
+        return True
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for sink_queue in self._queues:
+            while sink_queue.unfinished_tasks:
+                if deadline is not None and time.monotonic() > deadline:
+                    return False
+                time.sleep(0.05)
+        return True
+
+    def _work(self, sink, sink_queue):
+        while True:
+            notification = sink_queue.get()
+            try:
+                self._deliver(sink, notification)
+            finally:
+                sink_queue.task_done()
+
+    def _deliver(self, sink, notification):
+        delay = self._backoff
+        for attempt in range(self._retries + 1):
+            try:
+                sink.send(notification)
+                self.sent = self.sent + 1
+                logging.info("Notification sent via %s after %.2f sec", sink.name,
+                             time.time() - notification.created_at)
+                if notification.on_delivered:
+                    notification.on_delivered(notification, sink.name)
+                return
+            except Exception as ex:
+                logging.warning("Notification via %s failed, retry=%d, reason= %s", sink.name, attempt, ex)
+                if attempt < self._retries:
+                    time.sleep(delay + random.uniform(0, delay / 2))
+                    delay = min(delay * 2, self._max_backoff)
+        self.failed = self.failed + 1
+
+
+_default_dispatcher = None
+_default_lock = threading.Lock()
+
+
+def default_dispatcher():
+    global _default_dispatcher
+    with _default_lock:
+        if _default_dispatcher is None:
+            session = new_session()
+            sinks = []
+            if os.environ.get("TELEGRAM_API_TOKEN"):
+                sinks.append(TelegramSink(session, os.environ.get("TELEGRAM_API_TOKEN"),
+                                          os.environ.get("TELEGRAM_CHAT_ID"),
+                                          os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")))
+            if os.environ.get("NOTIFY_WEBHOOK_URL"):
+                sinks.append(WebhookSink(session, os.environ.get("NOTIFY_WEBHOOK_URL")))
+            if os.environ.get("NOTIFY_FILE"):
+                sinks.append(FileSink(os.environ.get("NOTIFY_FILE")))
+            _default_dispatcher = NotificationDispatcher(sinks)
+        return _default_dispatcher
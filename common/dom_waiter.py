@@ -0,0 +1,114 @@
+# dom_waiter.py
+import logging
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+# Installs (once per document) a MutationObserver plus alert/confirm hooks, then resolves a single promise as soon
+# as the page has settled after a change: loader gone, dialog shown, alert raised or result rendered.
+_WAIT_FOR_CHANGE_JS = """
+var timeoutMs = arguments[0], sinceVersion = arguments[1], quietMs = arguments[2], loaderClass = arguments[3],
+    dialogId = arguments[4], done = arguments[arguments.length - 1];
+var w = window.__terminWaiter, fresh = false;
+if (!w) {
+    fresh = true;
+    w = window.__terminWaiter = {version: 1, lastMutation: Date.now(), alerts: [], listeners: []};
+    var notify = function () {
+        w.version++;
+        w.lastMutation = Date.now();
+        w.listeners.slice().forEach(function (listener) { listener(); });
+    };
+    var record = function (result) {
+        return function (message) { w.alerts.push(String(message)); notify(); return result; };
+    };
+    window.alert = record(undefined);
+    window.confirm = record(true);
+    new MutationObserver(notify).observe(document.documentElement,
+        {childList: true, subtree: true, attributes: true, characterData: true});
+    document.addEventListener('readystatechange', notify);
+}
+var visible = function (el) {
+    return !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)
+        && window.getComputedStyle(el).visibility !== 'hidden';
+};
+var started = Date.now(), timer = null, finished = false;
+var finish = function (changed) {
+    if (finished) { return; }
+    finished = true;
+    clearTimeout(timer);
+    w.listeners.splice(w.listeners.indexOf(check), 1);
+    done({
+        changed: changed,
+        version: w.version,
+        elapsed_ms: Date.now() - started,
+        loader_visible: Array.prototype.some.call(document.getElementsByClassName(loaderClass), visible),
+        dialog_visible: visible(document.getElementById(dialogId)),
+        alerts: w.alerts.splice(0)
+    });
+};
+var check = function () {
+    var now = Date.now();
+    if (w.alerts.length || visible(document.getElementById(dialogId))) { return finish(true); }
+    var loader = Array.prototype.some.call(document.getElementsByClassName(loaderClass), visible);
+    var settled = document.readyState === 'complete' && !loader;
+    var quietLeft = quietMs - (now - w.lastMutation);
+    if ((fresh || w.version > sinceVersion) && settled && quietLeft <= 0) { return finish(true); }
+    if (now - started >= timeoutMs) { return finish(false); }
+    var remaining = timeoutMs - (now - started);
+    clearTimeout(timer);
+    timer = setTimeout(check, Math.max(10, quietLeft > 0 ? Math.min(quietLeft, remaining) : remaining));
+};
+w.listeners.push(check);
+check();
+"""
+
+
+class PageEvent:
+    def __init__(self, result):
+        self.changed = bool(result.get('changed'))
+        self.version = result.get('version', 0)
+        self.elapsed_ms = result.get('elapsed_ms', 0)
+        self.loader_visible = bool(result.get('loader_visible'))
+        self.dialog_visible = bool(result.get('dialog_visible'))
+        self.alerts = result.get('alerts') or []
+
+    def __repr__(self):
+        return ("PageEvent(changed={0}, loader_visible={1}, dialog_visible={2}, alerts={3}, elapsed_ms={4})"
+                .format(self.changed, self.loader_visible, self.dialog_visible, self.alerts, self.elapsed_ms))
+
+
+class DomWaiter:
+    """
+    Event driven replacement for fixed sleeps and stacked WebDriverWait probes.
+
+    Every call is one async script round trip that returns as soon as something relevant happened on the page,
+    so the retry loop runs at the server's pace instead of waiting out timeouts for things that never appear.
+    """
+
+    def __init__(self, driver, timeout=30, quiet_ms=300, loader_class="loading", dialog_id="additionalTimeDialog"):
+        self._driver = driver
+        self._timeout = timeout
+        self._quiet_ms = quiet_ms
+        self._loader_class = loader_class
+        self._dialog_id = dialog_id
+        self._version = 0
+
+    def reset(self):
+        self._version = 0
+
+    def wait_for_change(self, timeout=None):
+        timeout = self._timeout if timeout is None else timeout
+        self._driver.set_script_timeout(timeout + 5)
+        try:
+            result = self._driver.execute_async_script(_WAIT_FOR_CHANGE_JS, int(timeout * 1000), self._version,
+                                                       self._quiet_ms, self._loader_class, self._dialog_id)
+        except TimeoutException as ex:
+            logging.warning("Wait for page change timed out: %s", ex.msg)
+            result = {}
+        except WebDriverException as ex:
+            # navigation in progress or an unexpected alert, treat the page as changed and probe again
+            logging.warning("Wait for page change interrupted: %s", ex.msg)
+            result = {'changed': True}
+        event = PageEvent(result or {})
+        self._version = event.version
+        logging.debug("%s", event)
+        return event
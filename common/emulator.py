@@ -0,0 +1,429 @@
+# emulator.py
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common.clock import RealClock
+
+lea_start_path = "/ams/TerminBuchen"
+lea_agreement_path = "/ams/TerminBuchen/wizardng"
+lea_form_path = "/ams/TerminBuchen/wizardng/form"
+lea_submit_path = "/ams/TerminBuchen/wizardng/submit"
+apt_start_path = "/dienstleistung/120686"
+apt_calendar_path = "/terminvereinbarung/termin/all/120686/"
+apt_time_path = "/terminvereinbarung/termin/time/"
+
+default_visa_categories = {
+    "Aufenthaltstitel - verlängern": {
+        "Familiäre Gründe": [
+            "Aufenthaltserlaubnis für Ehepartner, Eltern und Kinder von ausländischen Familienangehörigen (§§ 29-34)"],
+        "Erwerbstätigkeit": ["Aufenthaltserlaubnis für Fachkräfte mit akademischer Ausbildung (§ 18b)"],
+    },
+    "Aufenthaltstitel in einen neuen Pass übertragen": {
+        "": ["Übertragen einer Aufenthaltserlaubnis auf einen neuen Pass(PASS)"],
+    },
+}
+
+
+class EmulatorConfig:
+    def __init__(self, latency=0.3, jitter=0.2, slot_at=60.0, slot_duration=600.0, session_seconds=900,
+                 p_too_many_hits=0.0, p_error=0.0, p_server_error=0.0, p_rejected=0.0, maintenance=False,
+                 apt_wait_seconds=10, apt_slot_date=None, dialog_before_end=60, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.slot_at = slot_at
+        self.slot_duration = slot_duration
+        self.session_seconds = session_seconds
+        self.p_too_many_hits = p_too_many_hits
+        self.p_error = p_error
+        self.p_server_error = p_server_error
+        self.p_rejected = p_rejected
+        self.maintenance = maintenance
+        self.apt_wait_seconds = apt_wait_seconds
+        self.apt_slot_date = apt_slot_date or (datetime.now() + timedelta(days=7)).strftime("%d.%m.%Y")
+        self.dialog_before_end = dialog_before_end
+        self.seed = seed
+
+
+class EmulatorState:
+    """Sessions, the published slot and every event the benchmark needs, guarded by one lock."""
+
+    def __init__(self, config, clock=None):
+        self.config = config
+        # a VirtualClock shared with the bot makes the emulator follow simulated time
+        self.clock = clock or RealClock()
+        self.random = random.Random(config.seed)
+        self.started_at = self.clock.time()
+        self.sessions = {}
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, kind, **details):
+        with self.lock:
+            self.events.append(dict(details, kind=kind, at=self.clock.time()))
+
+    def slot_available(self):
+        elapsed = self.clock.time() - self.started_at
+        return self.config.slot_at <= elapsed < self.config.slot_at + self.config.slot_duration
+
+    def slot_published_at(self):
+        return self.started_at + self.config.slot_at
+
+    def roll(self, probability):
+        with self.lock:
+            return self.random.random() < probability
+
+    def session(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = {"created_at": self.clock.time(), "agreed": False}
+            return self.sessions[session_id]
+
+    def stats(self):
+        with self.lock:
+            events = list(self.events)
+        now = self.clock.time()
+        minutes = max(now - self.started_at, 1) / 60
+
+        def count(kind):
+            return sum(1 for e in events if e["kind"] == kind)
+
+        def first(kind):
+            return next((e["at"] for e in events if e["kind"] == kind), None)
+
+        published = self.slot_published_at()
+        served = first("slot_served")
+        notified = first("notification")
+        return {
+            "elapsed_sec": now - self.started_at,
+            "start_page_hits": count("start_page"),
+            "checks": count("check"),
+            "checks_per_minute": count("check") / minutes,
+            "restarts_per_hour": max(count("start_page") - 1, 0) / minutes * 60,
+            "too_many_hits": count("too_many_hits"),
+            "server_errors": count("server_error"),
+            "slot_published_at": published,
+            "time_to_serve_slot": (served - published) if served else None,
+            "time_to_detect": (notified - published) if notified else None,
+        }
+
+
+def _form_select(select_id, options):
+    return '<select id="{0}" name="{0}"><option value="">-- Bitte wählen --</option>{1}</select>'.format(
+        select_id, "".join('<option value="{0}">{0}</option>'.format(o) for o in options))
+
+
+_LEA_FORM_SCRIPT = """
+<script>
+var expiresAt = Date.now() + %(remaining_ms)d;
+function show(id) { document.getElementById(id).style.display = 'block'; }
+function later(fn) { setTimeout(fn, %(latency_ms)d); }
+function tick() {
+    var left = Math.max(0, Math.round((expiresAt - Date.now()) / 1000));
+    var mm = ('0' + Math.floor(left / 60)).slice(-2), ss = ('0' + (left %% 60)).slice(-2);
+    document.getElementById('progressBar').textContent = mm + ':' + ss;
+    if (left <= %(dialog_before_end)d) { document.getElementById('additionalTimeDialog').style.display = 'block'; }
+}
+setInterval(tick, 1000);
+document.getElementById('xi-sel-400').addEventListener('change', function () { later(function () { show('xi-div-persons'); }); });
+document.getElementById('xi-sel-427').addEventListener('change', function (e) {
+    later(function () { e.target.value === 'ja' ? show('xi-div-family') : show('xi-div-categories'); });
+});
+document.getElementById('xi-sel-428').addEventListener('change', function () { later(function () { show('xi-div-categories'); }); });
+Array.prototype.forEach.call(document.querySelectorAll('[data-show]'), function (el) {
+    el.addEventListener('click', function () {
+        var input = document.getElementById(el.getAttribute('for'));
+        if (input) { input.checked = true; }
+        later(function () { show(el.getAttribute('data-show')); });
+    });
+});
+document.getElementById('additionalTimeDialogExtend').addEventListener('click', function () {
+    fetch('%(submit_path)s?extend=1', {method: 'POST'}).then(function (r) { return r.json(); }).then(function (data) {
+        expiresAt = Date.now() + data.remaining_ms;
+        document.getElementById('additionalTimeDialog').style.display = 'none';
+    });
+});
+document.getElementById('applicationForm:managedForm:proceed').addEventListener('click', function () {
+    var loader = document.getElementById('loading');
+    loader.style.display = 'block';
+    var checked = document.querySelector('input[name="visa_type"]:checked');
+    fetch('%(submit_path)s', {method: 'POST', headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({visa_type: checked ? checked.value : ''})})
+        .then(function (r) { return r.json(); })
+        .then(function (data) {
+            loader.style.display = 'none';
+            if (data.replace) { document.getElementById('xi-fs-content').innerHTML = data.html; }
+            else { document.getElementById('messagesBox').innerHTML = data.html; }
+        });
+});
+</script>
+"""
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/__stats":
+            return self._send_json(self.state.stats())
+        self._delay()
+        if url.path == lea_start_path:
+            return self._lea_start_page()
+        if url.path == lea_agreement_path:
+            return self._lea_agreement_page()
+        if url.path == lea_form_path:
+            return self._lea_form_page()
+        if url.path == apt_start_path:
+            return self._apt_start_page()
+        if url.path == apt_calendar_path:
+            return self._apt_calendar_page()
+        if url.path.startswith(apt_time_path):
+            return self._apt_time_page()
+        self.send_error(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if "/send" in url.path:
+            # stand-in for the Telegram bot API, the first notification marks detection
+            self.state.record("notification", path=url.path)
+            return self._send_json({"ok": True})
+        self._delay()
+        if url.path == lea_agreement_path:
+            return self._lea_agreement_submit(body)
+        if url.path == lea_submit_path:
+            return self._lea_submit(url, body)
+        self.send_error(404)
+
+    def log_message(self, fmt, *args):
+        logging.debug("emulator: " + fmt, *args)
+
+    # --- LEA / otv.verwalt-berlin.de ---
+
+    def _lea_start_page(self):
+        config = self.state.config
+        self.state.record("start_page", flow="lea")
+        if config.maintenance:
+            return self._send_html("<h1>Wartungsarbeiten</h1><p>Das System ist vorübergehend nicht erreichbar.</p>")
+        if self.state.roll(config.p_rejected):
+            return self._send_html("<p>The requested URL was rejected. Please consult with your administrator.</p>")
+        if self.state.roll(config.p_server_error):
+            self.state.record("server_error", flow="lea")
+            return self._send_html("<h1>500 - Internal Server Error</h1>", status=500)
+        link = '<a href="{0}?sprachauswahl=de">Termin buchen</a>'.format(lea_agreement_path)
+        nested = "<div>" * 9 + "<div><div><div>Willkommen</div><div>" + link + "</div></div></div>" + "</div>" * 9
+        self._send_html('<form id="mainForm">' + nested + '</form>', session_id=str(uuid.uuid4()))
+
+    def _lea_agreement_page(self):
+        self._send_html(
+            '<form id="applicationForm" method="post" action="{0}"><div id="xi-div-1">'
+            '<div>Hinweise zur Terminbuchung</div><div></div><div></div>'
+            '<div><input type="checkbox" id="xi-cb-1" name="agreement" value="1">'
+            '<label for="xi-cb-1">Zustimmung</label>'
+            '<label for="xi-cb-1"><p>Ich habe die Hinweise gelesen und stimme zu.</p></label></div></div>'
+            '<button type="submit" id="applicationForm:managedForm:proceed">Weiter</button></form>'
+            .format(lea_agreement_path))
+
+    def _lea_agreement_submit(self, body):
+        session = self.state.session(self._session_id())
+        if "agreement" in parse_qs(body.decode("utf-8")):
+            session["agreed"] = True
+            session["created_at"] = self.state.clock.time()
+            self.send_response(303)
+            self.send_header("Location", lea_form_path)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._lea_agreement_page()
+
+    def _lea_form_page(self):
+        config = self.state.config
+        session = self.state.session(self._session_id())
+        if not session["agreed"] or self._session_left(session) <= 0:
+            return self._send_html("<h1>Sitzungsende</h1><p>Ihre Sitzung ist abgelaufen.</p>")
+        categories = []
+        for category, sub_categories in default_visa_categories.items():
+            category_id = "c" + str(len(categories))
+            sub_html = []
+            for sub_category, visa_types in sub_categories.items():
+                sub_id = category_id + "s" + str(len(sub_html))
+                types = "".join('<input type="radio" name="visa_type" id="{0}t{1}" value="{2}">'
+                                '<label for="{0}t{1}">{2}</label>'.format(sub_id, i, t)
+                                for i, t in enumerate(visa_types))
+                if sub_category:
+                    sub_html.append('<label data-show="{0}">{1}</label><div id="{0}" style="display:none">{2}</div>'
+                                    .format(sub_id, sub_category, types))
+                else:
+                    sub_html.append(types)
+            categories.append('<label data-show="{0}">{1}</label><div id="{0}" style="display:none">{2}</div>'
+                              .format(category_id, category, "".join(sub_html)))
+        script = _LEA_FORM_SCRIPT % {"remaining_ms": self._session_left(session) * 1000,
+                                     "latency_ms": int(config.latency * 1000),
+                                     "dialog_before_end": config.dialog_before_end, "submit_path": lea_submit_path}
+        self._send_html(
+            '<div id="loading" class="loading" style="display:none">Bitte warten</div>'
+            '<div>Verbleibende Zeit: <span id="progressBar"></span></div>'
+            '<div id="additionalTimeDialog" style="display:none">Möchten Sie die Sitzung verlängern?'
+            '<button type="button" id="additionalTimeDialogExtend">Ja</button></div>'
+            '<div id="xi-fs-content"><h2>Angaben zum Anliegen</h2>'
+            + _form_select("xi-sel-400", ["Indien", "Türkei", "Vereinigte Staaten"])
+            + '<div id="xi-div-persons" style="display:none">'
+            + _form_select("xi-sel-422", ["eine Person", "zwei Personen", "drei Personen"])
+            + _form_select("xi-sel-427", ["ja", "nein"]) + '</div>'
+            + '<div id="xi-div-family" style="display:none">'
+            + _form_select("xi-sel-428", ["Indien", "Türkei", "Vereinigte Staaten"]) + '</div>'
+            + '<div id="xi-div-categories" style="display:none">' + "".join(categories) + '</div>'
+            + '<div id="messagesBox"></div></div>'
+            + '<button type="button" id="applicationForm:managedForm:proceed">Weiter</button>' + script)
+
+    def _lea_submit(self, url, body):
+        config = self.state.config
+        session = self.state.session(self._session_id())
+        if "extend" in parse_qs(url.query):
+            session["created_at"] = self.state.clock.time()
+            return self._send_json({"remaining_ms": self._session_left(session) * 1000})
+
+        self.state.record("check", flow="lea")
+        if self._session_left(session) <= 0:
+            return self._send_json({"replace": True, "html": "<h1>Sitzungsende</h1>"})
+        if self.state.roll(config.p_too_many_hits):
+            self.state.record("too_many_hits", flow="lea")
+            return self._send_json({"html": "<ul><li>Zu viele Zugriffe. Bitte versuchen Sie es später.</li></ul>"})
+        if self.state.roll(config.p_error):
+            self.state.record("server_error", flow="lea")
+            return self._send_json({"html": "<ul><li>Es ist ein Fehler aufgetreten.</li></ul>"})
+        if self.state.slot_available():
+            self.state.record("slot_served", flow="lea")
+            selected = json.loads(body or b"{}").get("visa_type", "")
+            return self._send_json({"replace": True, "html":
+                '<h2>Auswahl Termin</h2><p>Ausgewählte Dienstleistung: {0}</p>'
+                '<select id="xi-sel-3_1" name="time"><option value="09:00">09:00</option>'
+                '<option value="09:30">09:30</option></select><div class="g-recaptcha" data-sitekey="recaptcha">'
+                '</div>'.format(selected)})
+        return self._send_json({"html": "<ul><li>Für die gewählte Dienstleistung sind aktuell keine Termine frei! "
+                                        "Bitte versuchen Sie es zu einem späteren Zeitpunkt erneut.</li></ul>"})
+
+    def _session_left(self, session):
+        return int(session["created_at"] + self.state.config.session_seconds - self.state.clock.time())
+
+    # --- APT / service.berlin.de ---
+
+    def _apt_start_page(self):
+        self.state.record("start_page", flow="apt")
+        self._send_html('<h1>Anmeldung einer Wohnung</h1><a href="{0}">Berlinweite Terminbuchung</a>'
+                        .format(apt_calendar_path), session_id=str(uuid.uuid4()))
+
+    def _apt_calendar_page(self):
+        config = self.state.config
+        self.state.record("check", flow="apt")
+        if self.state.roll(config.p_too_many_hits):
+            self.state.record("too_many_hits", flow="apt")
+            return self._send_html('<div id="messagesBox"><ul><li>Zu viele Zugriffe.</li></ul></div>')
+        if self.state.roll(config.p_server_error):
+            self.state.record("server_error", flow="apt")
+            return self._send_html("<p>Bitte entschuldigen Sie den Fehler.</p>", status=500)
+        if self.state.slot_available():
+            self.state.record("slot_served", flow="apt")
+            timestamp = int(datetime.strptime(config.apt_slot_date, "%d.%m.%Y").timestamp())
+            return self._send_html(
+                '<h1>Terminvereinbarung</h1><p>Bitte wählen Sie ein Datum:</p><table><tr>'
+                '<td class="nichtbuchbar">1</td><td class="buchbar"><a href="{0}{1}/" '
+                'title="An diesem Tag einen Termin buchen" aria-label="{2} - An diesem Tag einen Termin buchen">{3}</a>'
+                '</td></tr></table>'.format(apt_time_path, timestamp, config.apt_slot_date,
+                                            config.apt_slot_date[:2]))
+        wait = config.apt_wait_seconds
+        self._send_html(
+            '<h1>Leider sind aktuell keine Termine für ihre Auswahl verfügbar.</h1>'
+            '<div>Nächste Aktualisierung in <span id="calculatedSecs">{0:02d}:{1:02d}</span> Minuten</div>'
+            '<button type="button" onclick="location.reload()">Terminsuche wiederholen</button>'
+            '<script>var left = {2}; setInterval(function () {{ left = Math.max(0, left - 1); '
+            'document.getElementById("calculatedSecs").textContent = ("0" + Math.floor(left / 60)).slice(-2) + ":" '
+            '+ ("0" + left % 60).slice(-2); }}, 1000);</script>'.format(wait // 60, wait % 60, wait))
+
+    def _apt_time_page(self):
+        self._send_html('<h1>Terminvereinbarung</h1><table><tr><th class="buchbar">09:00</th>'
+                        '<th class="buchbar">09:30</th></tr></table>')
+
+    # --- helpers ---
+
+    def _delay(self):
+        config = self.state.config
+        time.sleep(max(0.0, config.latency + self.state.random.uniform(-config.jitter, config.jitter)))
+
+    def _session_id(self):
+        for cookie in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "JSESSIONID":
+                return value
+        return ""
+
+    def _send_html(self, body, status=200, session_id=None):
+        html = ('<!DOCTYPE html><html lang="de"><head><meta charset="utf-8"><title>Emulator</title></head>'
+                '<body>' + body + '</body></html>').encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        if session_id:
+            self.send_header("Set-Cookie", "JSESSIONID={0}; Path=/".format(session_id))
+        self.end_headers()
+        self.wfile.write(html)
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_emulator(config, port=0, clock=None):
+    state = EmulatorState(config, clock)
+    handler = type("BoundEmulatorHandler", (EmulatorHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="emulator", daemon=True).start()
+    logging.info("Emulator running on http://127.0.0.1:%d (LEA %s, APT %s)", server.server_address[1],
+                 lea_start_path, apt_start_path)
+    return server
+
+
+def parse_config(args=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the LEA and service.berlin.de booking flows")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.3, help="server response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--slot-at", type=float, default=60.0, help="seconds until a slot is published")
+    parser.add_argument("--slot-duration", type=float, default=600.0)
+    parser.add_argument("--session-seconds", type=int, default=900)
+    parser.add_argument("--p-too-many-hits", type=float, default=0.0)
+    parser.add_argument("--p-error", type=float, default=0.0)
+    parser.add_argument("--p-server-error", type=float, default=0.0)
+    parser.add_argument("--p-rejected", type=float, default=0.0)
+    parser.add_argument("--maintenance", action="store_true")
+    parser.add_argument("--apt-wait-seconds", type=int, default=10)
+    parser.add_argument("--apt-slot-date", default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    values = parser.parse_args(args)
+    config = EmulatorConfig(latency=values.latency, jitter=values.jitter, slot_at=values.slot_at,
+                            slot_duration=values.slot_duration, session_seconds=values.session_seconds,
+                            p_too_many_hits=values.p_too_many_hits, p_error=values.p_error,
+                            p_server_error=values.p_server_error, p_rejected=values.p_rejected,
+                            maintenance=values.maintenance, apt_wait_seconds=values.apt_wait_seconds,
+                            apt_slot_date=values.apt_slot_date, seed=values.seed)
+    return values.port, config
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    emulator_port, emulator_config = parse_config()
+    start_emulator(emulator_config, emulator_port)
+    threading.Event().wait()
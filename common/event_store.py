@@ -0,0 +1,127 @@
+# event_store.py
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, appends then rely on O_APPEND only
+    fcntl = None
+
+from common.clock import default_clock
+
+
+class EventStore:
+    """
+    Append-only JSON lines log of probe outcomes: {"t": epoch seconds, "p": profile, "o": outcome, "n": count}.
+
+    Every process appends under an exclusive lock on a sidecar lock file. Once the file grows past
+    `compact_bytes`, events older than `retention_days` are dropped and runs of the same outcome for a profile
+    within one minute are folded into one event with a count.
+    """
+
+    def __init__(self, path, retention_days=90, compact_bytes=20 * 1024 * 1024):
+        self._path = path
+        self._retention = retention_days * 86400
+        self._compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def append(self, profile, outcome, at=None):
+        line = json.dumps({"t": round(at or default_clock().time(), 3), "p": profile, "o": outcome},
+                          ensure_ascii=False) + "\n"
+        with self._locked():
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(line)
+            if os.path.getsize(self._path) > self._compact_bytes:
+                self._compact()
+
+    def read(self, since=None, profile=None):
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # torn write of a crashed process
+                if since is not None and event["t"] < since:
+                    continue
+                if profile is not None and event["p"] != profile:
+                    continue
+                yield event
+
+    def compact(self):
+        with self._locked():
+            self._compact()
+
+    def _compact(self):
+        cutoff = default_clock().time() - self._retention
+        compacted = []
+        last = {}
+        for event in self.read(since=cutoff):
+            key = (event["p"], event["o"], int(event["t"] // 60))
+            previous = last.get(event["p"])
+            if previous is not None and previous[0] == key:
+                previous[1]["n"] = previous[1].get("n", 1) + event.get("n", 1)
+                continue
+            compacted.append(event)
+            last[event["p"]] = (key, event)
+        temp_path = self._path + ".compact"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for event in compacted:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self._path)
+        logging.info("Event store compacted to %d events", len(compacted))
+
+    def _locked(self):
+        return _FileLock(self._path + ".lock", self._lock)
+
+
+class _FileLock:
+    def __init__(self, path, thread_lock):
+        self._path = path
+        self._thread_lock = thread_lock
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self._path, "a")
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if self._file:
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_event_store():
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = EventStore(os.environ.get("EVENT_STORE_FILE", "events.jsonl"))
+        return _default_store
+
+
+def record_probe(profile, outcome):
+    try:
+        default_event_store().append(profile, outcome)
+    except OSError as ex:
+        logging.warning("Failed to record probe outcome, reason= %s", ex)
@@ -0,0 +1,73 @@
+# fixture_server.py
+import email.utils
+import hashlib
+import logging
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded pages from a directory: `/a/b/` and `/a/b` both map to `<root>/a/b.html`.
+
+    Responses carry an ETag and Last-Modified header and honour conditional requests, like the live site.
+    POST requests are recorded in `server.received` and answered with `{"ok": true}`, which makes the server
+    usable as a stub for notification sinks.
+    """
+
+    root = "."
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        self.server.received.append((self.path, dict(self.headers), body))
+        response = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self):
+        relative = self.path.split("?")[0].strip("/") or "index"
+        file_path = os.path.realpath(os.path.join(self.root, relative + ".html"))
+        if not file_path.startswith(os.path.realpath(self.root)) or not os.path.isfile(file_path):
+            self.send_error(404)
+            return
+
+        with open(file_path, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        last_modified = email.utils.formatdate(os.path.getmtime(file_path), usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.debug("fixture server: " + fmt, *args)
+
+
+def start_fixture_server(root, port=0):
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"root": root})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.received = []
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    logging.info("Serving %s on http://127.0.0.1:%d", root, server.server_address[1])
+    return server
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    fixture_server = start_fixture_server(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 8000)
+    threading.Event().wait()
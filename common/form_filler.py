@@ -0,0 +1,122 @@
+# form_filler.py
+import logging
+
+from selenium.common.exceptions import WebDriverException
+
+# Runs a compiled list of form steps inside the page. Every step first waits (in-page, no WebDriver round trip)
+# until its target is rendered and visible, then selects the option and fires change events or clicks the element.
+_FILL_FORM_JS = """
+var steps = arguments[0], stepTimeoutMs = arguments[1], loaderClass = arguments[2],
+    done = arguments[arguments.length - 1];
+var results = [];
+var visible = function (el) {
+    return !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)
+        && window.getComputedStyle(el).visibility !== 'hidden';
+};
+var loaderVisible = function () {
+    return Array.prototype.some.call(document.getElementsByClassName(loaderClass), visible);
+};
+var findByText = function (text) {
+    var walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
+    for (var node = walker.nextNode(); node; node = walker.nextNode()) {
+        if (node.nodeValue.indexOf(text) !== -1 && visible(node.parentElement)) { return node.parentElement; }
+    }
+    return null;
+};
+var target = function (step) {
+    if (step.action === 'select') {
+        var select = document.getElementById(step.id);
+        if (!visible(select)) { return null; }
+        var option = Array.prototype.find.call(select.options, function (o) { return o.text.trim() === step.value; });
+        return option ? {select: select, option: option} : null;
+    }
+    return findByText(step.value);
+};
+var apply = function (step, found) {
+    if (step.action === 'select') {
+        found.select.value = found.option.value;
+        found.select.dispatchEvent(new Event('input', {bubbles: true}));
+        found.select.dispatchEvent(new Event('change', {bubbles: true}));
+    } else {
+        found.click();
+    }
+};
+var run = function (index) {
+    if (index >= steps.length) { return done({ok: results.every(function (r) { return r.ok || r.optional; }), steps: results}); }
+    var step = steps[index], started = Date.now();
+    var attempt = function () {
+        var found = loaderVisible() ? null : target(step);
+        if (found) {
+            try {
+                apply(step, found);
+                results.push({name: step.name, ok: true, optional: step.optional, ms: Date.now() - started});
+            } catch (e) {
+                results.push({name: step.name, ok: false, optional: step.optional, error: String(e)});
+                if (!step.optional) { return done({ok: false, steps: results}); }
+            }
+            return setTimeout(function () { run(index + 1); }, 0);
+        }
+        if (Date.now() - started >= stepTimeoutMs) {
+            results.push({name: step.name, ok: false, optional: step.optional, error: 'not rendered'});
+            if (!step.optional) { return done({ok: false, steps: results}); }
+            return run(index + 1);
+        }
+        setTimeout(attempt, 50);
+    };
+    attempt();
+};
+run(0);
+"""
+
+
+def compile_form_steps(profile):
+    steps = [
+        {"name": "nationality", "action": "select", "id": "xi-sel-400", "value": profile.nationality},
+        {"name": "number of person", "action": "select", "id": "xi-sel-422", "value": profile.num_of_person},
+        {"name": "living with family", "action": "select", "id": "xi-sel-427",
+         "value": profile.family_living_in_berlin},
+        # only rendered when the family lives in Berlin
+        {"name": "family nationality", "action": "select", "id": "xi-sel-428", "value": profile.family_nationality,
+         "optional": True},
+    ]
+    return [dict(step, optional=step.get("optional", False)) for step in steps + compile_visa_steps(profile)]
+
+
+def compile_visa_steps(profile, current=None):
+    """
+    Steps selecting the visa category, sub-category and type of `profile`. When switching from the `current`
+    selection, unchanged levels are not clicked again, a second click would collapse them.
+    """
+    steps = []
+    if current is None or current.visa_category != profile.visa_category:
+        steps.append({"name": "visa category", "action": "click", "value": profile.visa_category})
+    if profile.sub_category != "" and (current is None or steps or current.sub_category != profile.sub_category):
+        steps.append({"name": "visa sub-category", "action": "click", "value": profile.sub_category})
+    steps.append({"name": "visa type", "action": "click", "value": profile.visa_type})
+    return [dict(step, optional=False) for step in steps]
+
+
+def fill_form(driver, profile, step_timeout=15, loader_class="loading", steps=None):
+    """
+    Fills the whole LEA form (or just the given `steps`) in one async script round trip.
+
+    Returns the per-step result dict (`ok`, `steps`) or None when the script itself could not run.
+    """
+    steps = steps or compile_form_steps(profile)
+    driver.set_script_timeout(step_timeout * len(steps) + 5)
+    try:
+        result = driver.execute_async_script(_FILL_FORM_JS, steps, int(step_timeout * 1000), loader_class)
+    except WebDriverException as ex:
+        logging.warning("In-page form fill failed, reason= %s", ex.msg)
+        return None
+    for step in result.get("steps", []):
+        if step.get("ok"):
+            logging.info("Form step %s done in %d ms", step.get("name"), step.get("ms", 0))
+        else:
+            logging.warning("Form step %s failed: %s", step.get("name"), step.get("error"))
+    return result
+
+
+def switch_visa_type(driver, profile, current, step_timeout=15):
+    """Re-selects the visa radio buttons on the rendered form, e.g. after "keine Termine frei"."""
+    return fill_form(driver, profile, step_timeout, steps=compile_visa_steps(profile, current))
@@ -0,0 +1,105 @@
+# handoff.py
+import logging
+import os
+import socket
+import time
+
+from common.clock import default_clock
+from common.metrics import registry
+
+ready_seconds = registry.histogram("bot_handoff_ready_seconds", "Slot detected until the page is ready for a human",
+                                   buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+
+# earliest offered time in the LEA time selection, then the captcha is brought into view
+_select_earliest_time_js = """
+var select = document.getElementById('xi-sel-3_1');
+if (!select) { return null; }
+var option = Array.prototype.find.call(select.options, function (o) { return o.value; });
+if (!option) { return null; }
+select.value = option.value;
+select.dispatchEvent(new Event('change', {bubbles: true}));
+var captcha = document.querySelector('.g-recaptcha, iframe[src*="recaptcha"]');
+if (captcha) { captcha.scrollIntoView({block: 'center'}); }
+return (option.text || option.value).trim();
+"""
+
+# the LEA "extend the session?" dialog, the label has to start with the whole word: "Ja, verlängern" but not
+# "Nein, nicht verlängern" or "Januar"
+extend_session_js = """
+var dialog = document.getElementById('additionalTimeDialog');
+var buttons = dialog ? dialog.querySelectorAll('button, input[type=button], input[type=submit], a') : [];
+var button = Array.prototype.find.call(buttons, function (b) {
+    return /^\\s*(ja|verlängern|yes|extend)(?![a-zäöüß])/i.test(b.textContent || b.value || '');
+});
+if (!button) { return false; }
+button.click();
+return true;
+"""
+
+
+def select_earliest_time(driver):
+    return driver.execute_script(_select_earliest_time_js)
+
+
+def accept_extension(driver):
+    return bool(driver.execute_script(extend_session_js))
+
+
+def handoff_enabled():
+    return os.environ.get("HANDOFF_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+class Handoff:
+    """
+    Gets a found slot ready for a human and holds it: `prepare` picks the slot on the page (earliest LEA time,
+    best APT day) and `keep_alive` runs every `keep_alive_interval` seconds while the bot waits, e.g. to accept
+    the LEA session extension dialog. The notification carries the picked slot, the page URL and, with
+    HANDOFF_REMOTE_VIEW_URL, where to take over the browser.
+    """
+
+    def __init__(self, bot_name, prepare, keep_alive=None, keep_alive_interval=5, remote_view_url=None):
+        self._bot_name = bot_name
+        self._prepare = prepare
+        self._keep_alive = keep_alive
+        self._keep_alive_interval = keep_alive_interval
+        self._remote_view_url = remote_view_url if remote_view_url is not None else \
+            os.environ.get("HANDOFF_REMOTE_VIEW_URL", "")
+        self.extensions = 0
+
+    def prepare(self, driver, detected_at):
+        """Picks the slot and returns the hint appended to the success message."""
+        try:
+            selected = self._prepare(driver)
+        except Exception as ex:
+            logging.warning("Handoff: slot not picked, reason= %s", ex)
+            selected = None
+        seconds = time.time() - detected_at
+        ready_seconds.observe(seconds, bot=self._bot_name)
+        logging.log(35, "Handoff: picked %s, ready for a human %.2f sec after detection", selected, seconds)
+        return self.hint(driver, selected)
+
+    def hint(self, driver, selected=None):
+        lines = []
+        if selected:
+            lines.append("Picked: {0}".format(selected))
+        lines.append("Page: {0}".format(driver.current_url))
+        if self._remote_view_url:
+            lines.append("Take over: {0}".format(self._remote_view_url))
+        else:
+            lines.append("Take over the browser on {0}{1}".format(
+                socket.gethostname(), " (headless)" if getattr(driver, "headless", False) else ""))
+        return "\n".join(lines)
+
+    def hold(self, driver, seconds):
+        """Keeps the session alive for `seconds`."""
+        clock = default_clock()
+        until = clock.monotonic() + seconds
+        while clock.monotonic() < until:
+            if self._keep_alive:
+                try:
+                    if self._keep_alive(driver):
+                        self.extensions = self.extensions + 1
+                        logging.warning("Handoff: session extended (%d)", self.extensions)
+                except Exception as ex:
+                    logging.warning("Handoff: keep alive failed, reason= %s", ex)
+            clock.sleep(min(self._keep_alive_interval, max(0.0, until - clock.monotonic())))
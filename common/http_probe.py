@@ -0,0 +1,132 @@
+# http_probe.py
+import logging
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.page_state import PageState, apartment_classifier
+
+user_agent = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/83.0.4103.53 Safari/537.36')
+date_pattern = re.compile(r'\d{2}\.\d{2}\.\d{4}')
+
+
+class BookableDate:
+    def __init__(self, date, href, label):
+        self.date = date
+        self.href = href
+        self.label = label
+
+    def __repr__(self):
+        return "BookableDate({0}, {1})".format(self.date.strftime("%d.%m.%Y"), self.href)
+
+
+class ProbeResult:
+    def __init__(self, state, dates, not_modified=False, size=0):
+        self.state = state
+        self.dates = dates
+        self.not_modified = not_modified
+        self.size = size
+
+
+class _CalendarParser(HTMLParser):
+    """Collects the start page link and every `td.buchbar > a` of the calendar."""
+
+    def __init__(self, start_link_text):
+        super().__init__()
+        self._start_link_text = start_link_text
+        self._in_bookable_cell = False
+        self._link = None
+        self._link_text = ""
+        self.start_link = None
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "td":
+            self._in_bookable_cell = "buchbar" in (attrs.get("class") or "").split()
+        elif tag == "a":
+            self._link = attrs
+            self._link_text = ""
+
+    def handle_data(self, data):
+        if self._link is not None:
+            self._link_text += data
+
+    def handle_endtag(self, tag):
+        if tag == "td":
+            self._in_bookable_cell = False
+        elif tag == "a" and self._link is not None:
+            if self._in_bookable_cell:
+                self.links.append(self._link)
+            elif self.start_link is None and self._start_link_text in self._link_text:
+                self.start_link = self._link.get("href")
+            self._link = None
+
+
+class CalendarProbe:
+    """
+    Reads the service.berlin.de appointment calendar over plain HTTP.
+
+    One pooled keep-alive session is reused for every check, cookies are kept between checks and the calendar is
+    fetched conditionally (ETag / Last-Modified), so an unchanged calendar costs a single 304 round trip.
+    """
+
+    def __init__(self, url, start_link_text="Berlinweite Terminbuchung", timeout=20):
+        self._url = url
+        self._start_link_text = start_link_text
+        self._timeout = timeout
+        self._calendar_url = None
+        self._validators = {}
+        self._last_result = None
+        self._session = requests.Session()
+        self._session.headers.update({"User-Agent": user_agent, "Accept-Language": "de-DE,de;q=0.9"})
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def close(self):
+        self._session.close()
+
+    def calendar_url(self):
+        if self._calendar_url is None:
+            response = self._session.get(self._url, timeout=self._timeout)
+            response.raise_for_status()
+            parser = _CalendarParser(self._start_link_text)
+            parser.feed(response.text)
+            if not parser.start_link:
+                raise Exception("'{0}' link not found on {1}".format(self._start_link_text, self._url))
+            self._calendar_url = urljoin(response.url, parser.start_link)
+            logging.info("Calendar url resolved to %s", self._calendar_url)
+        return self._calendar_url
+
+    def probe(self):
+        url = self.calendar_url()
+        response = self._session.get(url, headers=self._validators, timeout=self._timeout)
+        if response.status_code == 304 and self._last_result is not None:
+            return ProbeResult(self._last_result.state, self._last_result.dates, not_modified=True)
+        if response.status_code >= 500:
+            return ProbeResult(PageState.SERVER_ERROR, [], size=len(response.content))
+
+        self._validators = {}
+        if response.headers.get("ETag"):
+            self._validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            self._validators["If-Modified-Since"] = response.headers["Last-Modified"]
+
+        page = apartment_classifier.classify(response.text)
+        parser = _CalendarParser(self._start_link_text)
+        parser.feed(response.text)
+        dates = []
+        for link in parser.links:
+            label = link.get("aria-label") or link.get("title") or ""
+            date_match = date_pattern.search(label)
+            if date_match:
+                dates.append(BookableDate(datetime.strptime(date_match.group(), "%d.%m.%Y"),
+                                          urljoin(response.url, link.get("href") or ""), label))
+        self._last_result = ProbeResult(page.state, dates, size=len(response.content))
+        return self._last_result
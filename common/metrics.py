@@ -0,0 +1,232 @@
+# metrics.py
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+default_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = ["# HELP {0} {1}".format(self.name, self.help), "# TYPE {0} counter".format(self.name)]
+        for key, value in sorted(self.values().items()):
+            lines.append("{0}{1} {2}".format(self.name, _format_labels(key), value))
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        if self._fn:
+            try:
+                return self._fn()
+            except Exception as ex:
+                logging.debug("gauge %s failed, reason= %s", self.name, ex)
+                return float("nan")
+        return self._value
+
+    def render(self):
+        return ["# HELP {0} {1}".format(self.name, self.help), "# TYPE {0} gauge".format(self.name),
+                "{0} {1}".format(self.name, self.value())]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=default_buckets):
+        self.name = name
+        self.help = help_text
+        self._buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self._buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self._buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def summary(self):
+        with self._lock:
+            return {key: (s["count"], s["sum"] / s["count"] if s["count"] else 0.0) for key, s in self._series.items()}
+
+    def render(self):
+        lines = ["# HELP {0} {1}".format(self.name, self.help), "# TYPE {0} histogram".format(self.name)]
+        with self._lock:
+            series = {key: (list(s["counts"]), s["sum"], s["count"]) for key, s in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else str(bound)
+                lines.append("{0}_bucket{1} {2}".format(self.name, _format_labels(key + (("le", le),)), cumulative))
+            lines.append("{0}_sum{1} {2}".format(self.name, _format_labels(key), total))
+            lines.append("{0}_count{1} {2}".format(self.name, _format_labels(key), count))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name, help_text=""):
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def gauge(self, name, help_text="", fn=None):
+        return self._get_or_create(name, lambda: Gauge(name, help_text, fn))
+
+    def histogram(self, name, help_text="", buckets=default_buckets):
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+phase_seconds = registry.histogram("bot_phase_seconds", "Latency of bot phases")
+webdriver_command_seconds = registry.histogram("bot_webdriver_command_seconds", "Latency of WebDriver commands")
+outcomes_total = registry.counter("bot_outcomes_total", "Poll outcomes by type")
+restarts_total = registry.counter("bot_restarts_total", "Bot restarts")
+registry.gauge("bot_restarts_per_hour", "Restarts per hour since start",
+               lambda: restarts_total.total() * 3600 / max(time.time() - registry.started_at, 1))
+
+
+def timed(phase):
+    """Decorator recording the duration of the wrapped bot phase in bot_phase_seconds."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                phase_seconds.observe(time.monotonic() - started, phase=phase)
+
+        return wrapper
+
+    return decorator
+
+
+def record_outcome(outcome):
+    outcomes_total.inc(outcome=outcome)
+
+
+def record_restart(bot):
+    restarts_total.inc(bot=bot)
+
+
+def instrument_driver(driver):
+    """Wraps driver.execute so every WebDriver command lands in bot_webdriver_command_seconds."""
+    execute = driver.execute
+
+    def timed_execute(driver_command, params=None):
+        started = time.monotonic()
+        try:
+            return execute(driver_command, params)
+        finally:
+            webdriver_command_seconds.observe(time.monotonic() - started, command=driver_command)
+
+    driver.execute = timed_execute
+    return driver
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def summary_line():
+    phases = ", ".join("{0}={1}x{2:.2f}s".format(dict(key).get("phase"), count, mean)
+                       for key, (count, mean) in sorted(phase_seconds.summary().items()))
+    outcomes = ", ".join("{0}={1}".format(dict(key).get("outcome"), value)
+                         for key, value in sorted(outcomes_total.values().items()))
+    commands = webdriver_command_seconds.summary()
+    command_count = sum(count for count, _ in commands.values())
+    command_mean = (sum(count * mean for count, mean in commands.values()) / command_count) if command_count else 0
+    return "phases[{0}] outcomes[{1}] webdriver_commands={2} avg={3:.3f}s restarts/h={4:.1f}".format(
+        phases, outcomes, command_count, command_mean, registry.gauge("bot_restarts_per_hour").value())
+
+
+def start_metrics(port=None, summary_interval=None):
+    """Starts the /metrics endpoint (METRICS_PORT, disabled when unset) and the periodic summary log line."""
+    port = port if port is not None else int(os.environ.get("METRICS_PORT", "0") or 0)
+    summary_interval = summary_interval if summary_interval is not None else \
+        int(os.environ.get("METRICS_SUMMARY_INTERVAL", "300"))
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logging.info("Metrics available on http://127.0.0.1:%d/metrics", port)
+
+    def log_summary():
+        while True:
+            time.sleep(summary_interval)
+            logging.info("Metrics: %s", summary_line())
+
+    if summary_interval > 0:
+        threading.Thread(target=log_summary, name="metrics-summary", daemon=True).start()
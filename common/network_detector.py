@@ -0,0 +1,184 @@
+# network_detector.py
+import base64
+import collections
+import json
+import logging
+import threading
+import time
+
+from common.metrics import registry
+
+decision_seconds = registry.histogram("bot_response_decision_seconds",
+                                      "Server response fully received until classified by the bot",
+                                      buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+time_selection = 'id="xi-sel-3_1"'
+
+
+class ResponseEvent:
+    def __init__(self, url, page, elapsed, decision_latency):
+        self.url = url
+        self.page = page
+        self.state = page.state
+        self.has_time_selection = time_selection in page.source
+        self.elapsed = elapsed
+        self.decision_latency = decision_latency
+
+    def __repr__(self):
+        return "ResponseEvent({0}, state={1}, time_selection={2}, elapsed={3:.2f}s, decision={4:.0f}ms)".format(
+            self.url, self.state.name, self.has_time_selection, self.elapsed, self.decision_latency * 1000)
+
+
+def _text_of(body, mime_type):
+    # JSON answers carry the HTML fragments as escaped strings, markers are matched on the decoded values
+    if "json" not in mime_type:
+        return body
+    try:
+        values = [json.loads(body)]
+    except ValueError:
+        return body
+    parts = []
+    while values:
+        value = values.pop()
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+    return "\n".join(parts)
+
+
+def _target_id(window_handle):
+    # older chromedrivers prefix the DevTools target id of a window handle
+    return window_handle[len("CDwindow-"):] if window_handle.startswith("CDwindow-") else window_handle
+
+
+class PerformanceLog:
+    """
+    The browser wide performance log, split by tab: chromedriver hands out every entry only once, so it is read
+    in one place and each entry is kept for the tab (DevTools target) it came from until that tab asks for it.
+    """
+
+    def __init__(self, driver, max_entries=2000):
+        self._driver = driver
+        self._max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def of(driver):
+        """One log per browser, shared by every tab driven through it."""
+        log = getattr(driver, "performance_log", None)
+        if log is None:
+            log = driver.performance_log = PerformanceLog(driver)
+        return log
+
+    def drain(self, window_handle=None):
+        """Entries of the tab `window_handle` received since the last call, all entries without a handle."""
+        entries = self._driver.get_log("performance")
+        with self._lock:
+            for entry in entries:
+                try:
+                    target = json.loads(entry["message"]).get("webview", "").upper()
+                except (KeyError, ValueError, AttributeError):
+                    continue
+                self._entries.setdefault(target, collections.deque(maxlen=self._max_entries)).append(entry)
+            if window_handle is None:
+                drained = [entry for target in self._entries.values() for entry in target]
+                self._entries.clear()
+                return drained
+            target = self._entries.pop(_target_id(window_handle).upper(), ())
+            return list(target)
+
+
+class NetworkDetector:
+    """
+    Classifies the answer to a form submit from the network, as soon as its last byte arrived, instead of
+    waiting for the page to render it.
+
+    Reads the Network.* events chromedriver records in the performance log (enabled with BROWSER_NETWORK_EVENTS,
+    see custom_webdriver) of the tab that submitted, so racing lanes do not see each other's answers, and fetches
+    the body of the matching POST/XHR response with Network.getResponseBody while that tab is the current one.
+    The first submitted POST that finished loading ends the wait, whatever it classifies as; an answer that could
+    not be read is UNKNOWN. Returns None when nothing finished within the timeout. In both cases callers fall
+    back to the DOM.
+    """
+
+    def __init__(self, driver, classifier, url_part="", poll_interval=0.05):
+        self._driver = driver
+        self._classifier = classifier
+        self._url_part = url_part
+        self._poll_interval = poll_interval
+        self._requests = {}
+        self._submitted_at = None
+        self._window = None
+        self._log_available = True
+
+    @staticmethod
+    def available(driver):
+        return getattr(driver, "network_events", False)
+
+    def mark(self):
+        """Called right before the submit in the submitting tab; earlier traffic of that tab is dropped."""
+        try:
+            self._window = self._driver.current_window_handle
+        except Exception:
+            self._window = None
+        self._drain()
+        self._requests = {}
+        self._submitted_at = time.monotonic()
+
+    def wait_for_response(self, timeout):
+        if self._submitted_at is None or not self._log_available:
+            return None
+        deadline = time.monotonic() + timeout
+        while True:
+            for entry in self._drain():
+                event = self._on_entry(entry)
+                if event is not None:
+                    self._submitted_at = None
+                    decision_seconds.observe(event.decision_latency)
+                    logging.info("%s", event)
+                    return event
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+
+    def _drain(self):
+        try:
+            return PerformanceLog.of(self._driver).drain(self._window)
+        except Exception as ex:
+            logging.warning("Performance log not available, detecting answers from the page only, reason= %s", ex)
+            self._log_available = False
+            return []
+
+    def _on_entry(self, entry):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            return None
+        method, params = message.get("method"), message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            request = params.get("request", {})
+            if request.get("method") == "POST" and self._url_part in request.get("url", ""):
+                self._requests[params["requestId"]] = {"url": request["url"], "mime_type": ""}
+        elif method == "Network.responseReceived" and params.get("requestId") in self._requests:
+            self._requests[params["requestId"]]["mime_type"] = params.get("response", {}).get("mimeType", "")
+        elif method == "Network.loadingFailed" and params.get("requestId") in self._requests:
+            request = self._requests.pop(params["requestId"])
+            return ResponseEvent(request["url"], self._classifier.classify(""), time.monotonic() - self._submitted_at,
+                                 max(0.0, time.time() - entry["timestamp"] / 1000))
+        elif method == "Network.loadingFinished" and params.get("requestId") in self._requests:
+            request = self._requests.pop(params["requestId"])
+            try:
+                result = self._driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+            except Exception as ex:
+                logging.debug("response body not available, reason= %s", ex)
+                result = {}
+            body = result.get("body", "")
+            if result.get("base64Encoded"):
+                body = base64.b64decode(body).decode("utf-8", "replace")
+            page = self._classifier.classify(_text_of(body, request["mime_type"]))
+            return ResponseEvent(request["url"], page, time.monotonic() - self._submitted_at,
+                                 max(0.0, time.time() - entry["timestamp"] / 1000))
+        return None
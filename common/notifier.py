@@ -1,32 +1,38 @@
 # notifier.py
 import os
 
-import requests
+from common.dispatcher import new_session
+
+_session = new_session()
+
+
+def _api_url(method):
+    api_token = os.environ.get("TELEGRAM_API_TOKEN")
+    return "{0}/bot{1}/{2}".format(os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org"), api_token, method)
 
 
 def send_to_telegram(msg):
     message = "" + str(os.getpid()) + " : " + msg
-    api_token = os.environ.get("TELEGRAM_API_TOKEN")
     chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    api_url = f'https://api.telegram.org/bot{api_token}/sendMessage'
 
     try:
-        response = requests.post(api_url,
-                                 json={'chat_id': chat_id, 'text': message, 'parse_mode': 'Markdown'})
+        response = _session.post(_api_url("sendMessage"),
+                                 json={'chat_id': chat_id, 'text': message, 'parse_mode': 'Markdown'}, timeout=20)
         print(response.text)
     except Exception as e:
         print(e)
 
-def send_photo_to_telegram(msg, photo_path):
+def send_photo_to_telegram(msg, photo_path=None, photo=None):
     message = "" + str(os.getpid()) + " : " + msg
-    api_token = os.environ.get("TELEGRAM_API_TOKEN")
     chat_id = os.environ.get("TELEGRAM_CHAT_ID")
-    api_url = f'https://api.telegram.org/bot{api_token}/sendPhoto'
 
     try:
-        files = {'photo': open(photo_path, 'rb')}
         data = {'chat_id': chat_id, 'caption': message}
-        response = requests.post(api_url, files=files, data=data)
+        if photo is None:
+            with open(photo_path, 'rb') as f:
+                photo = f.read()
+        response = _session.post(_api_url("sendPhoto"), files={'photo': ('screenshot.png', photo)}, data=data,
+                                 timeout=20)
         print(response.text)
     except Exception as e:
         print(e)
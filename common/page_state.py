@@ -0,0 +1,154 @@
+# page_state.py
+import enum
+import logging
+import re
+
+from common.common_util import get_page_source
+
+# markers shared by both bots
+TOO_MANY_HITS = "Zu viele Zugriffe"
+MAINTENANCE = "Wartungsarbeiten"
+REJECTED_URL = "The requested URL was rejected. Please consult with your administrator"
+INTERNAL_SERVER_ERROR = "500 - Internal Server Error"
+
+# LEA / otv.verwalt-berlin.de markers
+REMAINING_TIME = "Verbleibende Zeit:"
+PROCEED_BUTTON = "applicationForm:managedForm:proceed"
+APPOINTMENT_SELECTION = "Auswahl Termin"
+MAIN_FORM = "Angaben zum Anliegen"
+SELECTED_SERVICE = "Ausgewählte Dienstleistung:"
+RECAPTCHA = "recaptcha"
+NO_APPOINTMENTS_FREE = "keine Termine frei"
+TRY_LATER = "späteren Zeitpunkt"
+ERROR = "Fehler"
+SESSION_END = "Sitzungsende"
+SESSION_ERROR = "Fehler ist aufgetreten. Bitte versuchen Sie es zu einem späteren Zeitpunkt nochmal."
+
+# APT / service.berlin.de markers
+NO_APPOINTMENTS = "keine Termine"
+SERVER_ERROR_APOLOGY = "Bitte entschuldigen Sie den Fehler"
+APPOINTMENT_BOOKING = "Terminvereinbarung"
+SELECT_DATE = "Bitte wählen Sie ein Datum:"
+WAIT_TIME_EXPIRED = "00:00 Minuten"
+
+
+class PageState(enum.Enum):
+    UNKNOWN = "unknown"
+    REJECTED = "rejected"
+    SERVER_ERROR = "server_error"
+    MAINTENANCE = "maintenance"
+    TOO_MANY_HITS = "too_many_hits"
+    SESSION_CLOSED = "session_closed"
+    SUCCESS = "success"
+    NO_APPOINTMENTS = "no_appointments"
+    TRY_LATER = "try_later"
+    ERROR = "error"
+    FORM_READY = "form_ready"
+    MAIN_FORM = "main_form"
+
+
+class MultiPatternMatcher:
+    """
+    Finds which of a fixed set of markers occur in a text in a single scan.
+
+    All markers are compiled into one longest-first alternation, so the regex engine walks the page once
+    and only stops at positions where some marker starts. Markers nested inside a longer match (e.g. "Fehler"
+    inside "Bitte entschuldigen Sie den Fehler") are derived from a precomputed containment table.
+    """
+
+    def __init__(self, markers):
+        self._markers = tuple(sorted(set(markers), key=len, reverse=True))
+        self._pattern = re.compile("|".join(re.escape(m) for m in self._markers))
+        self._implied = {m: frozenset(o for o in self._markers if o in m) for m in self._markers}
+
+    @property
+    def markers(self):
+        return self._markers
+
+    def find_all(self, text):
+        found = set()
+        pos = 0
+        search = self._pattern.search
+        while len(found) < len(self._markers):
+            match = search(text, pos)
+            if match is None:
+                break
+            found |= self._implied[match.group()]
+            pos = match.start() + 1
+        return frozenset(found)
+
+
+class PageSnapshot:
+    def __init__(self, source, markers, state):
+        self.source = source
+        self.markers = markers
+        self.state = state
+
+    def contains(self, text):
+        if text in self.markers:
+            return True
+        return text in self.source
+
+    def __repr__(self):
+        return "PageSnapshot(state={0}, markers={1})".format(self.state.name, sorted(self.markers))
+
+
+class PageClassifier:
+    """
+    Maps one page source snapshot to a PageState using an ordered rule table.
+
+    Each rule is (state, all_of, none_of); the first rule whose markers are all present and whose excluded
+    markers are all absent wins.
+    """
+
+    def __init__(self, rules, extra_markers=()):
+        self._rules = tuple((state, tuple(all_of), tuple(none_of)) for state, all_of, none_of in rules)
+        markers = set(extra_markers)
+        for _, all_of, none_of in self._rules:
+            markers.update(all_of)
+            markers.update(none_of)
+        self._matcher = MultiPatternMatcher(markers)
+
+    def classify(self, source):
+        source = source or ""
+        found = self._matcher.find_all(source)
+        for state, all_of, none_of in self._rules:
+            if all(m in found for m in all_of) and not any(m in found for m in none_of):
+                return PageSnapshot(source, found, state)
+        return PageSnapshot(source, found, PageState.UNKNOWN)
+
+    def snapshot(self, driver):
+        try:
+            source = get_page_source(driver)
+        except Exception as ex:
+            logging.warning("Page source not available, reason= %s", ex)
+            return PageSnapshot("", set(), PageState.UNKNOWN)
+        page = self.classify(source)
+        logging.debug("Page state: %s", page)
+        return page
+
+
+lea_classifier = PageClassifier([
+    (PageState.REJECTED, (REJECTED_URL,), ()),
+    (PageState.SERVER_ERROR, (INTERNAL_SERVER_ERROR,), ()),
+    (PageState.MAINTENANCE, (MAINTENANCE,), ()),
+    (PageState.TOO_MANY_HITS, (TOO_MANY_HITS,), ()),
+    (PageState.SUCCESS, (SELECTED_SERVICE, RECAPTCHA), ()),
+    (PageState.NO_APPOINTMENTS, (NO_APPOINTMENTS_FREE,), ()),
+    (PageState.SESSION_CLOSED, (SESSION_END,), (REMAINING_TIME,)),
+    (PageState.SESSION_CLOSED, (SESSION_ERROR,), (REMAINING_TIME,)),
+    (PageState.TRY_LATER, (TRY_LATER,), ()),
+    (PageState.ERROR, (ERROR,), ()),
+    (PageState.FORM_READY, (REMAINING_TIME, PROCEED_BUTTON), (APPOINTMENT_SELECTION,)),
+    (PageState.MAIN_FORM, (MAIN_FORM,), ()),
+], extra_markers=(SESSION_END, SESSION_ERROR))
+
+apartment_classifier = PageClassifier([
+    (PageState.REJECTED, (REJECTED_URL,), ()),
+    (PageState.SERVER_ERROR, (INTERNAL_SERVER_ERROR,), ()),
+    (PageState.MAINTENANCE, (MAINTENANCE,), ()),
+    (PageState.TOO_MANY_HITS, (TOO_MANY_HITS,), ()),
+    (PageState.SUCCESS, (APPOINTMENT_BOOKING, SELECT_DATE), ()),
+    (PageState.NO_APPOINTMENTS, (NO_APPOINTMENTS,), ()),
+    (PageState.ERROR, (SERVER_ERROR_APOLOGY,), ()),
+], extra_markers=(WAIT_TIME_EXPIRED,))
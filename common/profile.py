@@ -0,0 +1,66 @@
+# profile.py
+import hashlib
+import json
+import os
+
+
+class SearchProfile:
+    def __init__(self, name, nationality, num_of_person, family_living_in_berlin, family_nationality,
+                 visa_category, sub_category, visa_type):
+        self.name = name
+        self.nationality = nationality
+        self.num_of_person = num_of_person
+        self.family_living_in_berlin = family_living_in_berlin
+        self.family_nationality = family_nationality
+        self.visa_category = visa_category
+        self.sub_category = sub_category or ""
+        self.visa_type = visa_type
+
+    @classmethod
+    def from_env(cls, name=None):
+        return cls(name=name or os.environ.get("BOT_NAME", "LEA"),
+                   nationality=os.environ.get("LEA_NATIONALITY"),
+                   num_of_person=os.environ.get("LEA_NUMBER_OF_PERSON"),
+                   family_living_in_berlin=os.environ.get("LEA_LIVING_IN_BERLIN"),
+                   family_nationality=os.environ.get("LEA_NATIONALITY_OF_FAMILY_MEMBERS"),
+                   visa_category=os.environ.get("LEA_VISA_CATEGORY"),
+                   sub_category=os.environ.get("LEA_VISA_SUB_CATEGORY"),
+                   visa_type=os.environ.get("LEA_VISA_TYPE"))
+
+    @classmethod
+    def from_dict(cls, values, defaults=None):
+        # profile entries only need the keys that differ from the .env defaults
+        base = (defaults or cls.from_env()).__dict__.copy()
+        base.update(values)
+        return cls(**base)
+
+    def key(self):
+        # identifies what is searched for independent of the profile name, e.g. across machines
+        values = self.applicant() + (self.visa_category, self.sub_category, self.visa_type)
+        return "lea-" + hashlib.sha1("|".join(v or "" for v in values).encode("utf-8")).hexdigest()[:12]
+
+    def applicant(self):
+        # profiles with the same applicant can be swept within one form session
+        return self.nationality, self.num_of_person, self.family_living_in_berlin, self.family_nationality
+
+    def __repr__(self):
+        return "SearchProfile({0}: {1} / {2} / {3})".format(self.name, self.visa_category, self.sub_category,
+                                                            self.visa_type)
+
+
+def group_by_applicant(profiles):
+    groups = {}
+    for profile in profiles:
+        groups.setdefault(profile.applicant(), []).append(profile)
+    return list(groups.values())
+
+
+def load_profiles(path):
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    defaults = SearchProfile.from_dict(config.get("defaults", {}))
+    profiles = [SearchProfile.from_dict(values, defaults) for values in config.get("profiles", [])]
+    names = [p.name for p in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate profile names in {0}: {1}".format(path, names))
+    return profiles
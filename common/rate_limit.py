@@ -0,0 +1,164 @@
+# rate_limit.py
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the state is then only shared within one process
+    fcntl = None
+
+from common.clock import default_clock
+from common.coordination import default_coordinator
+from common.metrics import registry
+
+
+class RateLimitGovernor:
+    """
+    Token bucket with AIMD backoff whose state lives in a file shared by every bot on the host.
+
+    Each page load or form submit takes a token first. Accepted requests raise the rate additively, a
+    "Zu viele Zugriffe" answer halves it and starts a jittered cooldown for all bots, which keeps the sustained
+    query rate just below the point where the server starts penalising us. With a `coordinator` the cooldown
+    is also shared with the bots on other machines.
+    """
+
+    def __init__(self, state_file, initial_rate=0.5, min_rate=0.02, max_rate=2.0, burst=3, increase=0.01,
+                 decrease=0.5, cooldown=60.0, jitter=0.2, coordinator=None):
+        self._state_file = state_file
+        self._coordinator = coordinator
+        self._initial_rate = initial_rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._burst = burst
+        self._increase = increase
+        self._decrease = decrease
+        self._cooldown = cooldown
+        self._jitter = jitter
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.penalties = 0
+        self.waited = 0.0
+
+    def acquire(self, context=''):
+        waited = 0.0
+        while True:
+            shared_cooldown_until = self._coordinator.cooldown_until() if self._coordinator else 0.0
+            with self._locked_state() as state:
+                now = default_clock().time()
+                self._refill(state, now)
+                cooldown_until = max(state["cooldown_until"], shared_cooldown_until)
+                if now < cooldown_until:
+                    wait = cooldown_until - now
+                elif state["tokens"] >= 1:
+                    state["tokens"] = state["tokens"] - 1
+                    self.acquired = self.acquired + 1
+                    self.waited = self.waited + waited
+                    if waited > 0:
+                        logging.debug("%s : rate limit wait %.2f sec, rate=%.3f/s", context, waited, state["rate"])
+                    return waited
+                else:
+                    wait = (1 - state["tokens"]) / state["rate"]
+            wait = wait * (1 + random.uniform(0, self._jitter))
+            default_clock().sleep(wait)
+            waited = waited + wait
+
+    def on_success(self):
+        with self._locked_state() as state:
+            state["rate"] = min(self._max_rate, state["rate"] + self._increase)
+
+    def on_penalty(self, context=''):
+        with self._locked_state() as state:
+            now = default_clock().time()
+            state["rate"] = max(self._min_rate, state["rate"] * self._decrease)
+            state["tokens"] = 0
+            state["cooldown_until"] = max(state["cooldown_until"],
+                                          now + self._cooldown * (1 + random.uniform(0, self._jitter)))
+            state["penalties"] = state["penalties"] + 1
+            self.penalties = self.penalties + 1
+            logging.warning("%s : rate limited by server, rate=%.3f/s, cooldown %.0f sec", context, state["rate"],
+                            state["cooldown_until"] - now)
+            cooldown_until = state["cooldown_until"]
+        if self._coordinator:
+            self._coordinator.publish_cooldown(cooldown_until)
+
+    def current_rate(self):
+        with self._locked_state() as state:
+            return state["rate"]
+
+    def snapshot(self):
+        with self._locked_state() as state:
+            return dict(state)
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated_at"])
+        state["tokens"] = min(self._burst, state["tokens"] + elapsed * state["rate"])
+        state["updated_at"] = now
+
+    def _locked_state(self):
+        return _LockedState(self)
+
+
+class _LockedState:
+    def __init__(self, governor):
+        self._governor = governor
+        self._file = None
+        self._state = None
+
+    def __enter__(self):
+        governor = self._governor
+        governor._lock.acquire()
+        try:
+            self._file = open(governor._state_file, "a+", encoding="utf-8")
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            self._file.seek(0)
+            try:
+                self._state = json.loads(self._file.read())
+            except ValueError:
+                self._state = {"rate": governor._initial_rate, "tokens": governor._burst,
+                               "updated_at": default_clock().time(), "cooldown_until": 0.0, "penalties": 0}
+        except BaseException:
+            self._release()
+            raise
+        return self._state
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        try:
+            if exc_type is None:
+                self._file.seek(0)
+                self._file.truncate()
+                self._file.write(json.dumps(self._state))
+                self._file.flush()
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._file:
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._governor._lock.release()
+
+
+_default_governor = None
+_default_lock = threading.Lock()
+
+
+def default_governor():
+    global _default_governor
+    with _default_lock:
+        if _default_governor is None:
+            state_file = os.environ.get("RATE_LIMIT_STATE_FILE",
+                                        os.path.join(tempfile.gettempdir(), "berlin_termin_bot_rate_limit.json"))
+            _default_governor = RateLimitGovernor(state_file,
+                                                  initial_rate=float(os.environ.get("RATE_LIMIT_INITIAL_RATE", "0.5")),
+                                                  max_rate=float(os.environ.get("RATE_LIMIT_MAX_RATE", "2.0")),
+                                                  cooldown=float(os.environ.get("RATE_LIMIT_COOLDOWN", "60")),
+                                                  coordinator=default_coordinator())
+            registry.gauge("bot_rate_limit_requests_per_second", "Current shared request rate",
+                           _default_governor.current_rate)
+        return _default_governor
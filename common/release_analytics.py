@@ -0,0 +1,109 @@
+# release_analytics.py
+import logging
+import os
+import threading
+from datetime import datetime
+
+from common.clock import default_clock
+from common.event_store import default_event_store
+
+success_outcomes = frozenset(["success", "http_probe_match"])
+weekday_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+class ReleaseHistogram:
+    """
+    Per weekday / time-of-day bucket counts of probes and found slots, built from the event store.
+
+    probability() is the smoothed share of probes in a bucket that found a slot.
+    """
+
+    def __init__(self, bucket_minutes=15):
+        self.bucket_minutes = bucket_minutes
+        self.buckets_per_day = 24 * 60 // bucket_minutes
+        self.probes = [[0] * self.buckets_per_day for _ in range(7)]
+        self.releases = [[0] * self.buckets_per_day for _ in range(7)]
+
+    @classmethod
+    def from_events(cls, events, bucket_minutes=15):
+        histogram = cls(bucket_minutes)
+        for event in events:
+            histogram.add(datetime.fromtimestamp(event["t"]), event["o"], event.get("n", 1))
+        return histogram
+
+    def bucket(self, at):
+        return at.weekday(), (at.hour * 60 + at.minute) // self.bucket_minutes
+
+    def add(self, at, outcome, count=1):
+        weekday, index = self.bucket(at)
+        self.probes[weekday][index] += count
+        if outcome in success_outcomes:
+            self.releases[weekday][index] += count
+
+    def total_probes(self):
+        return sum(sum(day) for day in self.probes)
+
+    def probability(self, at, prior=0.5):
+        weekday, index = self.bucket(at)
+        # Laplace smoothing keeps unexplored buckets from looking dead
+        return (self.releases[weekday][index] + prior) / (self.probes[weekday][index] + 1)
+
+    def hot_spots(self, limit=5):
+        spots = [(self.releases[d][i], d, i) for d in range(7) for i in range(self.buckets_per_day)
+                 if self.releases[d][i]]
+        return ["{0} {1:02d}:{2:02d} ({3}x)".format(weekday_names[d], i * self.bucket_minutes // 60,
+                                                    i * self.bucket_minutes % 60, count)
+                for count, d, i in sorted(spots, reverse=True)[:limit]]
+
+
+class PollingSchedule:
+    """
+    Turns release probabilities into polling intervals: `min_interval` in the most likely windows,
+    `max_interval` in buckets that never produced a slot, log-scaled in between.
+
+    The histogram is rebuilt from the event store every `refresh_interval` seconds.
+    """
+
+    def __init__(self, store=None, profile=None, min_interval=None, max_interval=None, history_days=28,
+                 refresh_interval=1800, min_probes=200):
+        self._store = store or default_event_store()
+        self._profile = profile
+        self._min_interval = min_interval if min_interval is not None else \
+            float(os.environ.get("POLL_MIN_INTERVAL", "0"))
+        self._max_interval = max_interval if max_interval is not None else \
+            float(os.environ.get("POLL_MAX_INTERVAL", "60"))
+        self._history = history_days * 86400
+        self._refresh_interval = refresh_interval
+        self._min_probes = min_probes
+        self._histogram = None
+        self._max_probability = 0.0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        histogram = ReleaseHistogram.from_events(self._store.read(since=default_clock().time() - self._history,
+                                                                  profile=self._profile))
+        probabilities = [(histogram.releases[d][i] + 0.5) / (histogram.probes[d][i] + 1)
+                         for d in range(7) for i in range(histogram.buckets_per_day) if histogram.releases[d][i]]
+        self._histogram = histogram
+        self._max_probability = max(probabilities) if probabilities else 0.0
+        self._refreshed_at = default_clock().time()
+        logging.info("Polling schedule refreshed: %d probes, hot spots %s", histogram.total_probes(),
+                     histogram.hot_spots())
+
+    def interval_at(self, at=None):
+        with self._lock:
+            if default_clock().time() - self._refreshed_at > self._refresh_interval:
+                self.refresh()
+        histogram = self._histogram
+        if histogram is None or histogram.total_probes() < self._min_probes or self._max_probability == 0:
+            # not enough history yet, poll as fast as allowed
+            return self._min_interval
+        at = at or default_clock().now()
+        weekday, index = histogram.bucket(at)
+        if histogram.releases[weekday][index] == 0 and histogram.probes[weekday][index] >= self._min_probes / 10:
+            return self._max_interval
+        share = min(1.0, histogram.probability(at) / self._max_probability)
+        # share 1 -> min_interval, share -> 0 -> max_interval
+        low, high = max(self._min_interval, 0.1), max(self._max_interval, 0.1)
+        return low * (high / low) ** (1 - share) if high > low else low
@@ -0,0 +1,109 @@
+# screenshot.py
+import base64
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+from common.dispatcher import default_dispatcher
+from common.metrics import registry
+
+try:
+    from PIL import Image
+except ImportError:  # optional, screenshots are sent as captured
+    Image = None
+
+capture_seconds = registry.histogram("bot_screenshot_capture_seconds", "Screenshot capture latency")
+success_to_notify_seconds = registry.histogram("bot_success_to_notify_seconds",
+                                               "Success detected until the notification was delivered")
+
+
+def capture_png(driver):
+    """Returns the current viewport as PNG bytes, straight from Chrome over CDP without touching the disk."""
+    started = time.monotonic()
+    try:
+        data = driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "png", "fromSurface": True})["data"]
+        png = base64.b64decode(data)
+    except Exception as ex:
+        logging.warning("CDP screenshot failed, falling back to WebDriver, reason= %s", ex)
+        png = driver.get_screenshot_as_png()
+    capture_seconds.observe(time.monotonic() - started)
+    return png
+
+
+def shrink(png, max_width, quality):
+    """Downscales to `max_width` and recompresses as JPEG; returns the input unchanged without Pillow."""
+    if Image is None or not max_width:
+        return png
+    image = Image.open(io.BytesIO(png))
+    if image.width > max_width:
+        image = image.resize((max_width, image.height * max_width // image.width))
+    output = io.BytesIO()
+    image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True)
+    return output.getbuffer()
+
+
+class ScreenshotPipeline:
+    """
+    Capture on the caller's thread (the only WebDriver round trip), everything else on a worker thread:
+    optional downscale/recompress (SCREENSHOT_MAX_WIDTH, SCREENSHOT_QUALITY, needs Pillow), optional archive
+    copy (SCREENSHOT_DIR, off by default) and hand-over of the buffer to the notification dispatcher.
+    """
+
+    def __init__(self, dispatcher, max_width=None, quality=None, archive_dir=None):
+        self._dispatcher = dispatcher
+        self._max_width = max_width if max_width is not None else int(os.environ.get("SCREENSHOT_MAX_WIDTH", "0"))
+        self._quality = quality if quality is not None else int(os.environ.get("SCREENSHOT_QUALITY", "80"))
+        self._archive_dir = archive_dir if archive_dir is not None else os.environ.get("SCREENSHOT_DIR", "")
+        self._queue = queue.Queue()
+        threading.Thread(target=self._work, name="screenshot", daemon=True).start()
+
+    def notify(self, driver, message, key, detected_at=None):
+        detected_at = detected_at or time.time()
+        try:
+            png = capture_png(driver)
+        except Exception as ex:
+            logging.warning("Screenshot not available, reason= %s", ex)
+            png = None
+        self._queue.put((message, png, key, detected_at))
+
+    def _work(self):
+        while True:
+            message, photo, key, detected_at = self._queue.get()
+            try:
+                if photo is not None:
+                    photo = self._process(photo, key)
+            except Exception as ex:
+                logging.warning("Screenshot processing failed, sending original, reason= %s", ex)
+            self._dispatcher.notify(message, photo=photo, key=key, detected_at=detected_at,
+                                    on_delivered=_observe_latency)
+
+    def _process(self, png, key):
+        photo = shrink(png, self._max_width, self._quality)
+        if self._archive_dir:
+            file_name = os.path.join(self._archive_dir, key + (".png" if photo is png else ".jpg"))
+            with open(file_name, "wb") as f:
+                f.write(photo)
+            logging.info("Screenshot archived to %s", file_name)
+        logging.info("Screenshot ready: %d bytes (captured %d)", len(photo), len(png))
+        return photo
+
+
+def _observe_latency(notification, sink_name):
+    latency = time.time() - notification.detected_at
+    success_to_notify_seconds.observe(latency, sink=sink_name)
+    logging.log(35, "Success to %s notification: %.2f sec", sink_name, latency)
+
+
+_default_pipeline = None
+_default_lock = threading.Lock()
+
+
+def default_pipeline():
+    global _default_pipeline
+    with _default_lock:
+        if _default_pipeline is None:
+            _default_pipeline = ScreenshotPipeline(default_dispatcher())
+        return _default_pipeline
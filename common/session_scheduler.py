@@ -0,0 +1,94 @@
+# session_scheduler.py
+import logging
+
+from common.clock import default_clock
+from common.metrics import registry
+
+attempts_per_session = registry.histogram("bot_attempts_per_session", "Form submits per LEA session",
+                                          buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+response_seconds = registry.histogram("bot_submit_response_seconds", "Submit to rendered result latency")
+
+
+class SessionScheduler:
+    """
+    Treats the remaining LEA session time as a budget for submits.
+
+    The deadline is taken from the progressBar once per session (and after each extension) and then tracked
+    locally, so no round trip is spent re-reading the countdown before every submit. Observed response times
+    and the shared rate tell how long one submit cycle takes: submits are spaced one cycle apart, which spreads
+    the attempts that fit evenly over the session instead of spending the rate budget in bursts, and the session
+    is extended or recycled just before it would expire instead of running into "Sitzungsende".
+    """
+
+    def __init__(self, governor, safety_margin=5.0, smoothing=0.3):
+        self._governor = governor
+        self._safety_margin = safety_margin
+        self._smoothing = smoothing
+        self._deadline = None
+        self._response_time = None
+        self._last_submit = None
+        self.attempts = 0
+        self.extensions = 0
+
+    def start_session(self, remaining_sec):
+        self._deadline = default_clock().monotonic() + remaining_sec if remaining_sec > 0 else None
+        self._last_submit = None
+        self.attempts = 0
+        self.extensions = 0
+        logging.info("Session budget %d sec, %s attempts planned", remaining_sec, self.planned_attempts())
+
+    def extended(self, remaining_sec):
+        self.extensions = self.extensions + 1
+        self._deadline = default_clock().monotonic() + remaining_sec if remaining_sec > 0 else self._deadline
+        logging.info("Session extended, budget %d sec, %s attempts planned", remaining_sec, self.planned_attempts())
+
+    def end_session(self):
+        if self.attempts:
+            attempts_per_session.observe(self.attempts)
+            logging.info("Session ended after %d attempts, %d extensions", self.attempts, self.extensions)
+        self._deadline = None
+        self.attempts = 0
+
+    def submitted(self):
+        self.attempts = self.attempts + 1
+        self._last_submit = default_clock().monotonic()
+
+    def next_submit_in(self):
+        """Seconds until the next planned submit, one cycle after the previous one."""
+        if self._last_submit is None:
+            return 0.0
+        return max(0.0, self._last_submit + self.cycle_time() - default_clock().monotonic())
+
+    def observe_response(self, seconds):
+        response_seconds.observe(seconds)
+        if self._response_time is None:
+            self._response_time = seconds
+        else:
+            self._response_time = self._smoothing * seconds + (1 - self._smoothing) * self._response_time
+
+    @property
+    def response_time(self):
+        return self._response_time
+
+    def remaining(self):
+        if self._deadline is None:
+            return None
+        return self._deadline - default_clock().monotonic()
+
+    def cycle_time(self):
+        # a submit cycle takes at least one server response and at least one token of the shared rate budget
+        min_interval = 1 / max(self._governor.current_rate(), 1e-6)
+        return max(self._response_time or 0.0, min_interval)
+
+    def planned_attempts(self):
+        remaining = self.remaining()
+        if remaining is None:
+            return "unknown"
+        return max(0, int((remaining - self._safety_margin) / self.cycle_time()))
+
+    def is_expiring(self):
+        """True when another submit would not get its answer before the session ends."""
+        remaining = self.remaining()
+        if remaining is None:
+            return False
+        return remaining <= (self._response_time or 0.0) + self._safety_margin
@@ -0,0 +1,146 @@
+# session_snapshot.py
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common.metrics import registry
+
+snapshot_replays_total = registry.counter("bot_snapshot_replays_total", "Session snapshot replays by result")
+snapshot_seconds_saved_total = registry.counter("bot_snapshot_seconds_saved_total",
+                                                "Seconds saved by resuming from a session snapshot")
+
+_dump_storage_js = """
+function dump(storage) {
+    var values = {};
+    for (var i = 0; i < storage.length; i++) { values[storage.key(i)] = storage.getItem(storage.key(i)); }
+    return values;
+}
+return {local: dump(window.localStorage), session: dump(window.sessionStorage)};
+"""
+
+# registered for new documents before the replay navigation, so the page scripts already see the storage
+_restore_storage_js = """
+(function (origin, local, session) {
+    if (location.origin !== origin) { return; }
+    Object.keys(local).forEach(function (k) { window.localStorage.setItem(k, local[k]); });
+    Object.keys(session).forEach(function (k) { window.sessionStorage.setItem(k, session[k]); });
+})(%s, %s, %s);
+"""
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    return parts.scheme + "://" + parts.netloc
+
+
+class SessionSnapshot:
+    """Cookies, local and session storage and the form URL of a browser that just passed the agreement."""
+
+    def __init__(self, url, cookies, local_storage, session_storage, captured_at=None):
+        self.url = url
+        self.cookies = cookies
+        self.local_storage = local_storage
+        self.session_storage = session_storage
+        self.captured_at = captured_at or time.time()
+
+    @classmethod
+    def capture(cls, driver):
+        storage = driver.execute_script(_dump_storage_js) or {}
+        return cls(driver.current_url, driver.get_cookies(), storage.get("local", {}), storage.get("session", {}))
+
+    def age(self):
+        return time.time() - self.captured_at
+
+    def replay(self, driver):
+        """Installs cookies and storage in `driver` and opens the form URL; the caller validates the page."""
+        origin = origin_of(self.url)
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [_cdp_cookie(c, origin) for c in self.cookies]})
+        script = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+            "source": _restore_storage_js % (json.dumps(origin), json.dumps(self.local_storage),
+                                             json.dumps(self.session_storage))})
+        try:
+            driver.get(self.url)
+        finally:
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script["identifier"]})
+
+
+def _cdp_cookie(cookie, origin):
+    converted = {"name": cookie["name"], "value": cookie["value"], "path": cookie.get("path", "/"),
+                 "secure": cookie.get("secure", False), "httpOnly": cookie.get("httpOnly", False)}
+    if cookie.get("domain"):
+        converted["domain"] = cookie["domain"]
+    else:
+        converted["url"] = origin
+    if cookie.get("expiry"):
+        converted["expires"] = cookie["expiry"]
+    if cookie.get("sameSite"):
+        converted["sameSite"] = cookie["sameSite"]
+    return converted
+
+
+class SnapshotStore:
+    """
+    Latest snapshot per profile plus the average duration of the full start page / agreement path, which
+    tells how much a successful replay saved. Snapshots older than `max_age` seconds are not replayed
+    (SESSION_SNAPSHOT_MAX_AGE, default 600, 0 disables snapshots).
+    """
+
+    def __init__(self, max_age=None, smoothing=0.3):
+        self._max_age = max_age if max_age is not None else int(os.environ.get("SESSION_SNAPSHOT_MAX_AGE", "600"))
+        self._smoothing = smoothing
+        self._snapshots = {}
+        self._full_path_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._max_age > 0
+
+    def put(self, key, snapshot, full_path_seconds=None):
+        with self._lock:
+            self._snapshots[key] = snapshot
+            if full_path_seconds is not None:
+                if self._full_path_seconds is None:
+                    self._full_path_seconds = full_path_seconds
+                else:
+                    self._full_path_seconds = (self._smoothing * full_path_seconds
+                                               + (1 - self._smoothing) * self._full_path_seconds)
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.age() > self._max_age:
+                del self._snapshots[key]
+                return None
+            return snapshot
+
+    def invalidate(self, key):
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+    def accepted(self, replay_seconds, steps_saved):
+        saved = max(0.0, (self._full_path_seconds or replay_seconds) - replay_seconds)
+        snapshot_replays_total.inc(result="accepted")
+        snapshot_seconds_saved_total.inc(saved)
+        logging.info("Session resumed from snapshot in %.2f sec, skipped %d steps, saved %.2f sec", replay_seconds,
+                     steps_saved, saved)
+
+    def rejected(self, key, reason):
+        self.invalidate(key)
+        snapshot_replays_total.inc(result="rejected")
+        logging.warning("Session snapshot rejected, taking the full path, reason= %s", reason)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_snapshots():
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = SnapshotStore()
+        return _default_store
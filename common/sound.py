@@ -1,42 +1,127 @@
 # sound.py
 import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
 import time
 
-from AppKit import NSSound
-from Foundation import NSURL
 
+class MacBackend:
+    """NSSound built once from the in-memory clip; AppKit is only imported when this backend is chosen."""
+    name = "macos"
 
-# stolen from https://github.com/JaDogg/pydoro/blob/develop/pydoro/pydoro_core/sound.py
-def play_sound_osx(sound, block=True):
+    def __init__(self):
+        from AppKit import NSSound
+        from Foundation import NSData
+        self._ns_sound_class = NSSound
+        self._ns_data_class = NSData
+        self._ns_sound = None
+
+    def load(self, data):
+        ns_data = self._ns_data_class.dataWithBytes_length_(data, len(data))
+        self._ns_sound = self._ns_sound_class.alloc().initWithData_(ns_data)
+        if not self._ns_sound:
+            raise IOError("Unable to decode sound")
+
+    def play(self):
+        self._ns_sound.stop()
+        self._ns_sound.play()
+        time.sleep(self._ns_sound.duration())
+
+
+class LinuxBackend:
+    """Pipes the preloaded clip into aplay (ALSA) or paplay (PulseAudio/PipeWire), no file is read per play."""
+    name = "linux"
+    players = (("paplay",), ("aplay", "-q", "-"))
+
+    def __init__(self):
+        self._command = None
+        for command in self.players:
+            if shutil.which(command[0]):
+                self._command = list(command)
+                break
+        if self._command is None:
+            raise IOError("Neither paplay nor aplay found")
+        self._data = None
+
+    def load(self, data):
+        self._data = data
+
+    def play(self):
+        subprocess.run(self._command, input=self._data, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       timeout=60, check=True)
+
+
+class NullBackend:
+    """Plays nothing; for servers without audio and for tests, which can check `plays`."""
+    name = "null"
+
+    def __init__(self):
+        self.plays = 0
+
+    def load(self, data):
+        pass
+
+    def play(self):
+        self.plays = self.plays + 1
+
+
+backends = {"macos": MacBackend, "linux": LinuxBackend, "null": NullBackend}
+
+
+def select_backend(name=None):
+    """SOUND_BACKEND=macos|linux|null, by default the one matching the platform, null if that is unavailable."""
+    name = name or os.environ.get("SOUND_BACKEND") or ("macos" if sys.platform == "darwin" else "linux")
+    try:
+        return backends[name]()
+    except Exception as ex:
+        logging.warning("Sound backend %s not available, alarm is muted, reason= %s", name, ex)
+        return NullBackend()
+
+
+class Alarm:
     """
-    Utilizes AppKit.NSSound. Tested and known to work with MP3 and WAVE on
-    OS X 10.11 with Python 2.7. Probably works with anything QuickTime supports.
-    Probably works on OS X 10.5 and newer. Probably works with all versions of
-    Python.
-    Inspired by (but not copied from) Aaron's Stack Overflow answer here:
-    http://stackoverflow.com/a/34568298/901641
-    I never would have tried using AppKit.NSSound without seeing his code.
+    The alarm clip decoded once and played on a dedicated thread; play() only enqueues and returns immediately,
+    plays requested while one is still running are merged.
     """
 
-    logging.info("Play sound")
-    if "://" not in sound:
-        if not sound.startswith("/"):
-            from os import getcwd
+    def __init__(self, path, backend=None):
+        self.backend = backend or select_backend()
+        self._requests = queue.Queue(1)
+        try:
+            with open(path, "rb") as f:
+                self.backend.load(f.read())
+        except Exception as ex:
+            logging.warning("Failed to load alarm %s, alarm is muted, reason= %s", path, ex)
+            self.backend = NullBackend()
+        threading.Thread(target=self._work, name="alarm", daemon=True).start()
+
+    def play(self):
+        try:
+            self._requests.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def _work(self):
+        while True:
+            self._requests.get()
+            try:
+                logging.info("Play sound")
+                self.backend.play()
+            except Exception as ex:
+                logging.warning("Failed to play alarm via %s, reason= %s", self.backend.name, ex)
 
-            sound = getcwd() + "/" + sound
-        sound = "file://" + sound
-    url = NSURL.URLWithString_(sound)
-    ns_sound = NSSound.alloc().initWithContentsOfURL_byReference_(url, True)
-    if not ns_sound:
-        raise IOError("Unable to load sound named: " + sound)
-    ns_sound.play()
 
-    if block:
-        time.sleep(ns_sound.duration())
+_default_alarm = None
+_default_lock = threading.Lock()
 
 
-class Sound:
-    def __init__(self, name, dog):
-        self.name = name
-        self.dog = dog
-        sound.play_sound_osx(self.name)
+def default_alarm():
+    global _default_alarm
+    with _default_lock:
+        if _default_alarm is None:
+            _default_alarm = Alarm(os.environ.get("ALARM_FILE", os.path.join(os.getcwd(), "alarm.wav")))
+        return _default_alarm
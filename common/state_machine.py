@@ -0,0 +1,89 @@
+# state_machine.py
+import collections
+import logging
+
+from common.clock import default_clock
+from common.metrics import registry
+from common.supervisor import RestartRequired, NAVIGATE
+
+state_dwell_seconds = registry.histogram("bot_state_dwell_seconds", "Time spent in one visit of a bot state")
+
+
+class State:
+    """
+    One step of a StateMachine. `handler` checks what matters in this state and returns an event, `transitions`
+    maps events to the next state; a state without handler is final.
+
+    `retries` and `deadline` bound consecutive visits of the state that made no progress: re-entering it more
+    than `retries` times or staying longer than `deadline` seconds gives up the round with RestartRequired(tier).
+    Events in `progress` keep the bot in the state but reset both budgets.
+    """
+
+    def __init__(self, name, handler=None, transitions=None, deadline=None, retries=None, tier=NAVIGATE,
+                 progress=()):
+        self.name = name
+        self.handler = handler
+        self.transitions = transitions or {}
+        self.deadline = deadline
+        self.retries = retries
+        self.tier = tier
+        self.progress = progress
+
+
+class StateMachine:
+    """
+    Runs a bot as explicit states instead of nested loops, so no state can hold up the bot forever.
+
+    Every visit is traced, the dwell time goes to bot_state_dwell_seconds and the last `trace_size` visits
+    (state, event, seconds) are kept for summary().
+    """
+
+    def __init__(self, bot_name, states, trace_size=200):
+        self._bot_name = bot_name
+        self._states = {state.name: state for state in states}
+        for state in states:
+            for event, target in state.transitions.items():
+                if target not in self._states:
+                    raise ValueError("{0}: {1} --{2}--> unknown state {3}".format(bot_name, state.name, event, target))
+        self.trace = collections.deque(maxlen=trace_size)
+
+    def run(self, start):
+        """Runs from `start` until a final state is reached and returns its name."""
+        state = self._states[start]
+        streak_started, visits = default_clock().monotonic(), 0
+        while state.handler is not None:
+            visits = visits + 1
+            started = default_clock().monotonic()
+            event = "raised"
+            try:
+                event = state.handler()
+            finally:
+                self._visited(state, event, default_clock().monotonic() - started)
+            if event not in state.transitions:
+                raise ValueError("{0}: unexpected event {1!r} in state {2}".format(self._bot_name, event, state.name))
+            target = self._states[state.transitions[event]]
+            if target is not state or event in state.progress:
+                state, streak_started, visits = target, default_clock().monotonic(), 0
+                continue
+            dwell = default_clock().monotonic() - streak_started
+            if state.retries is not None and visits > state.retries:
+                raise RestartRequired("{0}: no progress in state {1} after {2} attempts".format(
+                    self._bot_name, state.name, visits), state.tier)
+            if state.deadline is not None and dwell > state.deadline:
+                raise RestartRequired("{0}: no progress in state {1} after {2:.0f} sec".format(
+                    self._bot_name, state.name, dwell), state.tier)
+        return state.name
+
+    def _visited(self, state, event, seconds):
+        self.trace.append((state.name, event, seconds))
+        state_dwell_seconds.observe(seconds, bot=self._bot_name, state=state.name)
+        logging.debug("State %s -> %s after %.2f sec", state.name, event, seconds)
+
+    def summary(self):
+        """Visits and total dwell time per state over the trace, slowest first."""
+        totals = collections.OrderedDict()
+        for name, _, seconds in self.trace:
+            visits, total = totals.get(name, (0, 0.0))
+            totals[name] = (visits + 1, total + seconds)
+        return ", ".join("{0} {1}x {2:.2f}s".format(name, visits, total) for name, (visits, total)
+                         in sorted(totals.items(), key=lambda item: -item[1][1]))
@@ -0,0 +1,179 @@
+# supervisor.py
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+from urllib3.exceptions import HTTPError
+
+from common.clock import default_clock
+from common.custom_webdriver import configure_tab, is_lean
+from common.metrics import registry
+
+# recovery tiers, cheapest first
+NAVIGATE = "navigate"
+CLEAR_STATE = "clear_state"
+RESET_TAB = "reset_tab"
+RELAUNCH = "relaunch"
+tiers = (NAVIGATE, CLEAR_STATE, RESET_TAB, RELAUNCH)
+
+recovery_seconds = registry.histogram("bot_recovery_seconds", "Duration of a recovery by tier")
+recoveries_total = registry.counter("bot_recoveries_total", "Recoveries by tier")
+
+_browser_gone_messages = ("chrome not reachable", "disconnected", "session deleted", "invalid session id")
+_tab_broken_messages = ("tab crashed", "page crash", "target frame detached", "no such window")
+_cleared_storage_types = "cookies,local_storage,session_storage,indexeddb,websql,service_workers"
+
+
+class RestartRequired(Exception):
+    """Raised by a bot to give up the current round; `tier` is the cheapest recovery that can fix it."""
+
+    def __init__(self, message, tier=NAVIGATE):
+        super().__init__(message)
+        self.tier = tier
+
+
+def classify_failure(ex):
+    if isinstance(ex, RestartRequired):
+        return ex.tier
+    message = str(ex).lower()
+    if isinstance(ex, (InvalidSessionIdException, ConnectionError, HTTPError)) \
+            or any(m in message for m in _browser_gone_messages):
+        return RELAUNCH
+    if isinstance(ex, NoSuchWindowException) or any(m in message for m in _tab_broken_messages):
+        return RESET_TAB
+    return NAVIGATE
+
+
+def navigate(driver, url):
+    driver.get(url)
+
+
+def clear_state(driver, url):
+    parts = urlsplit(url)
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": parts.scheme + "://" + parts.netloc,
+                                                          "storageTypes": _cleared_storage_types})
+    driver.get(url)
+
+
+def reset_tab(driver, url):
+    old_handles = driver.window_handles
+    driver.switch_to.new_window('tab')
+    new_handle = driver.current_window_handle
+    for handle in old_handles:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(new_handle)
+    configure_tab(driver, is_lean(driver))
+    driver.get(url)
+
+
+recoveries = {NAVIGATE: navigate, CLEAR_STATE: clear_state, RESET_TAB: reset_tab}
+
+
+class Supervisor:
+    """
+    Keeps one bot running and recovers it from failures with the cheapest action that can work: back to the
+    start page, clear cookies and storage, replace the tab, and relaunching the browser only as a last resort.
+
+    The tier comes from classify_failure() and escalates by one after `escalate_after` consecutive failures
+    that did not get the bot back to a ready form (SUPERVISOR_ESCALATE_AFTER, default 3). A failed recovery
+    falls through to a relaunch. The bot needs `driver`, `start_url`, `run()`, `restarted(tier)`, `ready` and
+    `close(message)`.
+
+    With a `lease` the bot only runs on the node holding it, other nodes stand by until it expires.
+    """
+
+    def __init__(self, name, factory, escalate_after=None, lease=None):
+        self._name = name
+        self._factory = factory
+        self._lease = lease
+        self._escalate_after = escalate_after if escalate_after is not None else \
+            int(os.environ.get("SUPERVISOR_ESCALATE_AFTER", "3"))
+        self._streak = 0
+        self._relaunch_started = None
+        self.recoveries = dict.fromkeys(tiers, 0)
+
+    def run(self, until_relaunch=False, hold_for=None):
+        """
+        Runs the bot forever; with `until_relaunch` it returns once the browser had to be given up. With `hold_for`
+        it also gives up the browser at the first failure after that many seconds instead of recovering in place.
+        """
+        if self._lease and not self._lease.held:
+            self._lease.acquire()
+        held_until = None if hold_for is None else default_clock().monotonic() + hold_for
+        bot = self._launch()
+        while True:
+            try:
+                bot.run()
+                return
+            except (KeyboardInterrupt, SystemExit) as ex:
+                bot.close(repr(ex))
+                if self._lease:
+                    self._lease.release()
+                raise
+            except Exception as ex:
+                tier = self._tier_for(ex, bot)
+                if self._lease and not self._lease.held:
+                    # another node took over while this one was stuck
+                    bot.close(str(ex))
+                    if until_relaunch:
+                        # the caller stands by for the lease itself, e.g. without holding a local slot
+                        return
+                    self._lease.acquire()
+                    bot = self._launch()
+                    continue
+                if held_until is not None and default_clock().monotonic() > held_until:
+                    logging.info("%s held the browser for %.0f sec, handing it over", self._name, hold_for)
+                    bot.close(str(ex))
+                    return
+                if tier != RELAUNCH and self._recover(bot, tier, ex):
+                    continue
+                self._relaunch_started = time.monotonic()
+                bot.close(str(ex))
+                if until_relaunch:
+                    return
+                bot = self._launch()
+
+    def _tier_for(self, ex, bot):
+        self._streak = 0 if bot.ready else self._streak + 1
+        index = tiers.index(classify_failure(ex))
+        if self._escalate_after > 0:
+            index = index + self._streak // self._escalate_after
+        return tiers[min(index, len(tiers) - 1)]
+
+    def _recover(self, bot, tier, ex):
+        logging.warning("Recovering via %s from: %s", tier, ex)
+        started = time.monotonic()
+        try:
+            recoveries[tier](bot.driver, bot.start_url)
+        except Exception as recovery_error:
+            logging.warning("Recovery via %s failed, relaunching, reason= %s", tier, recovery_error)
+            return False
+        bot.restarted(tier)
+        self._observe(tier, time.monotonic() - started)
+        return True
+
+    def _launch(self):
+        while True:
+            try:
+                bot = self._factory()
+                break
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception as ex:
+                logging.exception("Failed to start bot, reason= %s", ex)
+                default_clock().sleep(5)
+        if self._relaunch_started is not None:
+            self._observe(RELAUNCH, time.monotonic() - self._relaunch_started)
+            self._relaunch_started = None
+            self._streak = 0
+        return bot
+
+    def _observe(self, tier, seconds):
+        self.recoveries[tier] = self.recoveries[tier] + 1
+        recoveries_total.inc(bot=self._name, tier=tier)
+        recovery_seconds.observe(seconds, tier=tier)
+        logging.info("Recovered via %s in %.2f sec", tier, seconds)
@@ -0,0 +1,160 @@
+# tab_racer.py
+import logging
+import math
+import os
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from common.clock import default_clock
+from common.custom_webdriver import configure_tab, is_lean
+from common.metrics import registry
+from common.supervisor import RestartRequired
+
+active_lanes = registry.histogram("bot_race_active_lanes", "Lanes polled per racing round",
+                                  buckets=(1, 2, 3, 4, 6, 8))
+
+
+def open_isolated_tab(driver, url):
+    """
+    Opens `url` in a new tab with its own cookie jar (a separate CDP browser context), so it gets its own
+    server session. Falls back to a plain tab, which shares cookies with the others, when that is not possible.
+    """
+    before = set(driver.window_handles)
+    try:
+        context = driver.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False})
+        driver.execute_cdp_cmd("Target.createTarget", {"url": "about:blank",
+                                                       "browserContextId": context["browserContextId"]})
+        handle = None
+        for _ in range(20):
+            new_handles = set(driver.window_handles) - before
+            if new_handles:
+                handle = new_handles.pop()
+                break
+            time.sleep(0.1)
+        if handle is None:
+            raise WebDriverException("tab of the new browser context not visible to the driver")
+        driver.switch_to.window(handle)
+    except WebDriverException as ex:
+        logging.warning("Isolated tab not available, opening a shared tab, reason= %s", ex.msg)
+        driver.switch_to.new_window('tab')
+    configure_tab(driver, is_lean(driver))
+    driver.get(url)
+    return driver.current_window_handle
+
+
+class TabRacer:
+    """
+    Races K lanes, each a bot with its own tab and form session, inside one browser.
+
+    One controller visits the lanes round robin with short page waits and staggers their submits, so a
+    submit is in flight most of the time instead of one tab sitting through every loader. The number of lanes
+    that are actually polled is what the shared rate budget can feed: rate x response time, at most K. The
+    first lane that finds a slot wins, the others are parked. A lane failing with RestartRequired re-enters
+    its own session; everything else goes up to the supervisor.
+
+    Exposes the same interface as a bot (`driver`, `start_url`, `run()`, `restarted()`, `ready`, `close()`).
+    """
+
+    def __init__(self, factory, tabs, governor, poll_timeout=0.5, max_lane_failures=3):
+        self._factory = factory
+        self._tabs = tabs
+        self._governor = governor
+        self._poll_timeout = poll_timeout
+        self._max_lane_failures = max_lane_failures
+        self._lead = factory(None, 0)
+        self._lanes = [self._lead]
+        self._failures = {}
+        self._last_submit = 0.0
+
+    @property
+    def driver(self):
+        return self._lead.driver
+
+    @property
+    def start_url(self):
+        return self._lead.start_url
+
+    @property
+    def ready(self):
+        return any(lane.ready for lane in self._lanes)
+
+    def restarted(self, tier=None):
+        for lane in self._lanes:
+            lane.restarted(tier)
+
+    def budget(self):
+        response_times = [lane.scheduler.response_time for lane in self._lanes if lane.scheduler.response_time]
+        response_time = max(response_times) if response_times else 5.0
+        return max(1, min(len(self._lanes), math.ceil(self._governor.current_rate() * response_time)))
+
+    def run(self):
+        self._open_lanes()
+        for lane in self._lanes:
+            self._enter(lane)
+        while True:
+            lanes = self._lanes[:self.budget()]
+            active_lanes.observe(len(lanes))
+            for lane in lanes:
+                self.driver.switch_to.window(lane.window)
+                try:
+                    if lane.poll(self._poll_timeout):
+                        logging.info("Lane %s won the race, parking %d other lanes", lane.window,
+                                     len(self._lanes) - 1)
+                        return
+                    self._failures[lane.window] = 0
+                except RestartRequired as ex:
+                    # also a slot another node claimed first: this lane searches on, the others keep racing
+                    lane.scheduler.end_session()
+                    failures = self._failures.get(lane.window, 0) + 1
+                    self._failures[lane.window] = failures
+                    if failures > self._max_lane_failures:
+                        raise
+                    logging.warning("Lane %s: %s, re-entering", lane.window, ex)
+                    self._enter(lane)
+
+    def close(self, message):
+        for lane in self._lanes[1:]:
+            try:
+                self.driver.switch_to.window(lane.window)
+                self.driver.close()
+            except WebDriverException:
+                pass
+        self._lanes = [self._lead]
+        try:
+            self.driver.switch_to.window(self._lead.window)
+        except WebDriverException:
+            pass
+        self._lead.close(message)
+
+    def _open_lanes(self):
+        handles = set(self.driver.window_handles)
+        if self._lead.window not in handles:
+            # the supervisor replaced the tab
+            self._lead.window = self.driver.current_window_handle
+        self._lanes = [self._lead] + [lane for lane in self._lanes[1:] if lane.window in handles]
+        while len(self._lanes) < self._tabs:
+            open_isolated_tab(self.driver, self.start_url)
+            lane = self._factory(self.driver, len(self._lanes))
+            lane.submit_gate = self._gate
+            self._lanes.append(lane)
+        self._lead.submit_gate = self._gate
+        logging.info("Racing %d lanes: %s", len(self._lanes), [lane.window for lane in self._lanes])
+
+    def _enter(self, lane):
+        self.driver.switch_to.window(lane.window)
+        lane.prepare_session()
+
+    def _gate(self):
+        response_times = [lane.scheduler.response_time for lane in self._lanes if lane.scheduler.response_time]
+        stagger = (max(response_times) if response_times else 5.0) / self.budget()
+        now = default_clock().monotonic()
+        if now - self._last_submit < stagger:
+            return False
+        self._last_submit = now
+        return True
+
+
+def race_tabs():
+    """LEA_RACE_TABS, 1 (the default) disables racing."""
+    return max(1, int(os.environ.get("LEA_RACE_TABS", "1")))
@@ -1,30 +1,104 @@
 import logging
 import os
+import time
 import traceback
 
 from dotenv import load_dotenv
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
-from common.common_util import send_success_message, find_by_xpath, count_by_xpath, sleep, select_dropdown, \
-    init_logger, is_page_contains_text, handle_unexpected_alert, click_by_xpath, send_error_message, get_wait_time
-from common.custom_webdriver import WebDriver
+from common.browser_pool import BrowserPool
+from common.clock import default_clock
+from common.common_util import send_success_message, claim_slot, count_by_xpath, sleep, select_dropdown, \
+    init_logger, handle_unexpected_alert, click_by_xpath, send_error_message, get_wait_time
+from common.coordination import default_coordinator
+from common.custom_webdriver import WebDriver, record_page_load
+from common.dom_waiter import DomWaiter
+from common.form_filler import fill_form, switch_visa_type
+from common.handoff import Handoff, handoff_enabled, select_earliest_time, accept_extension
+from common.profile import SearchProfile
+from common.event_store import record_probe
+from common.sound import default_alarm
+from common.metrics import timed, record_outcome, record_restart, start_metrics
+from common.network_detector import NetworkDetector
+from common.release_analytics import PollingSchedule
+from common.rate_limit import default_governor
+from common.session_scheduler import SessionScheduler
+from common.session_snapshot import SessionSnapshot, default_snapshots
+from common.state_machine import State, StateMachine
+from common.supervisor import Supervisor, RestartRequired, CLEAR_STATE
+from common.tab_racer import TabRacer, race_tabs
+from common.page_state import PageState, lea_classifier, REMAINING_TIME, PROCEED_BUTTON, APPOINTMENT_SELECTION, \
+    MAIN_FORM, SESSION_END, SESSION_ERROR
 
-page_url = "https://otv.verwalt-berlin.de/ams/TerminBuchen"
 bot_name = "lea_berlin_bot"
+# longest wait for the submit answer on the network before the page is looked at instead
+response_timeout = 5
 success_message = ("✅ possible AUSLANDERHORDE APPOINTMENT found. Please hurry to book your appointment by selecting "
                    "first available time and captcha.")
+# start page load, start link, agreement tick and agreement submit
+full_path_steps = 4
+
+
+def page_url():
+    # read on use, .env is only loaded once the process started
+    return os.environ.get("LEA_PAGE_URL", "https://otv.verwalt-berlin.de/ams/TerminBuchen")
 
 
 class BerlinBot:
-    def __init__(self):
-        self._driver = WebDriver(bot_name).__enter__()
+    def __init__(self, pool=None, profile=None, targets=None, driver=None, lane=None):
+        self._started_at = time.monotonic()
+        self._profile = profile or SearchProfile.from_env()
+        # sweep mode: several visa types of the same applicant take turns within one session
+        self._targets = targets or [self._profile]
+        self._name = "+".join(target.name for target in self._targets)
+        # racing mode: further lanes drive their own tab of the lead lane's browser
+        if lane:
+            self._name = "{0}#{1}".format(self._name, lane)
+        self._pool = pool
+        if driver:
+            self._driver = driver
+        elif pool:
+            self._driver = pool.acquire()
+        else:
+            self._driver = WebDriver(bot_name).__enter__()
+            default_governor().acquire('__init__')
+            self.driver.get(page_url())
         self._bot_name = bot_name
-        self.driver.get(page_url)
+        self.window = self.driver.current_window_handle
         self.driver.minimize_window()
         self.timeout_count = 0
+        self.submit_gate = None
+        self._awaiting_response = False
+        # sweep mode: the visa type was switched, the old answer stays on the page until the new one is submitted
+        self._switched = False
+        self.waiter = DomWaiter(self._driver)
+        # classifies the submit answer from the network before it is rendered, the DOM stays the fallback
+        self.detector = NetworkDetector(self._driver, lea_classifier) if NetworkDetector.available(self._driver) \
+            else None
+        self.scheduler = SessionScheduler(default_governor())
+        self.polling_schedule = PollingSchedule(profile=self._profile.name if len(self._targets) == 1 else None)
+        self.snapshots = default_snapshots()
+        self._path_started_at = None
+        self.handoff = Handoff(bot_name, select_earliest_time, accept_extension) if handoff_enabled() else None
+        self.machine = self.build_machine()
+
+    def build_machine(self):
+        return StateMachine(self._name, [
+            State("resume", self.resume_or_start, {"resumed": "main_form", "missing": "start_page"}),
+            # 500 errors are refreshed in place, a few times only
+            State("start_page", self.enter_start_page, {"entered": "agreement", "server_error": "start_page"},
+                  retries=10),
+            State("agreement", self.tick_off_agreement, {"ticked": "main_form"}),
+            State("main_form", self.wait_for_main_form, {"ready": "fill", "waiting": "main_form"}, deadline=60),
+            State("fill", self.enter_form, {"filled": "form_ready"}),
+            State("form_ready"),
+            # every submit is progress; a form that neither submits nor finds a slot for 10 minutes is stuck
+            State("submit", self.submit_step, {"found": "found", "submitted": "submit", "waiting": "submit"},
+                  deadline=600, progress=("submitted",)),
+            State("found"),
+        ])
 
     def find_appointment(self):
         rounds = 0
@@ -35,88 +109,251 @@ class BerlinBot:
 
     def fill_search_form(self, rounds=0):
         logging.info("Round - # %d, SessionId=%s", rounds, self.driver.session_id)
-        self.enter_start_page()
-        self.tick_off_agreement()
-        self.enter_form()
-
-        # retry submit
-        while True:
-            sleep(2, 'fill_search_form_start')
-            if self.is_success():
-                send_success_message(self.driver, bot_name, success_message)
-                return
-            elif (self.is_loader_not_visible()
-                  and not is_page_contains_text(self.driver, "Auswahl Termin")
-                  and is_page_contains_text(self.driver, "Verbleibende Zeit:")
-                  and is_page_contains_text(self.driver, "applicationForm:managedForm:proceed")):
-                self.submit_form("Form Submit.", By.ID, 'applicationForm:managedForm:proceed')
-
-            handle_unexpected_alert(self.driver)
-            self.restart_if_rejected()
-            self.close_if_additional_dialog_window_found()
-
-            if self.is_error_message("späteren Zeitpunkt"):
-                logging.warning("Got message - Try again later, retrying..")
-            elif self.is_error_message("keine Termine frei"):
-                logging.warning("No appointment available, retrying..")
-            elif self.is_error_message("Zu viele Zugriffe"):
-                logging.warning("Too many hits, restarting..")
-                raise
-            elif self.is_error_message("Fehler"):
-                logging.warning("Fehler from berlin.de, restarting..")
-                raise
-            elif self.is_success():
-                send_success_message(self.driver, bot_name, success_message)
-                return
-
-            if not is_page_contains_text(self.driver, "Verbleibende Zeit:"):
-                self.restart_if_required()
-
-            if (self.is_loader_not_visible()
-                    and (self.is_error_message("späteren Zeitpunkt") or self.is_error_message("keine Termine frei"))
-                    and is_page_contains_text(self.driver, "Verbleibende Zeit:")
-                    and is_page_contains_text(self.driver, "applicationForm:managedForm:proceed")):
-                self.submit_form("Form Submit.", By.ID, 'applicationForm:managedForm:proceed')
+        self.prepare_session()
+        try:
+            self.retry_submit()
+        finally:
+            self.scheduler.end_session()
+
+    def prepare_session(self):
+        self.machine.run("resume")
+        self.report_restart_time()
+        self.scheduler.start_session(self.print_time_left())
+        self.waiter.reset()
+        self._awaiting_response = False
+        self._switched = False
+
+    def retry_submit(self):
+        self.machine.run("submit")
+
+    def resume_or_start(self):
+        if self.resume_session():
+            return "resumed"
+        self._path_started_at = time.monotonic()
+        return "missing"
+
+    def submit_step(self):
+        if self.poll():
+            return "found"
+        return "submitted" if self._awaiting_response else "waiting"
+
+    def poll(self, timeout=None):
+        """One pass of the submit loop: wait for the page, classify it and submit again. True once a slot is found."""
+        if self._awaiting_response and self.detector and self.act_on_response(timeout):
+            return True
+        event = self.waiter.wait_for_change(timeout)
+        if timeout is not None and self._awaiting_response and not event.changed:
+            # still in flight, nothing to look at yet
+            return False
+        if self._awaiting_response and event.changed:
+            self.scheduler.observe_response(event.elapsed_ms / 1000)
+        self._awaiting_response = False
+        for alert_text in event.alerts:
+            logging.warning("Alert text: %s", alert_text)
+        # native alerts are not visible to the page hook, probe without waiting
+        handle_unexpected_alert(self.driver, 0)
+        self.close_if_additional_dialog_window_found(event)
+
+        page = lea_classifier.snapshot(self.driver)
+        self.restart_if_rejected(page)
+        if page.state is PageState.SUCCESS:
+            if self.is_success(page):
+                self.report_success()
+                return True
+        elif page.state is PageState.TRY_LATER and not self._switched:
+            logging.warning("Got message - Try again later, retrying..")
+            self.record('try_later')
+            default_governor().on_success()
+            if self.next_target():
+                # submit once the next wait saw the visa type rerender settle
+                self._switched = True
+                return False
+        elif page.state is PageState.NO_APPOINTMENTS and not self._switched:
+            logging.warning("No appointment available, retrying..")
+            self.record('no_slots')
+            default_governor().on_success()
+            if self.next_target():
+                self._switched = True
+                return False
+        elif page.state is PageState.TOO_MANY_HITS:
+            logging.warning("Too many hits, restarting..")
+            self.record('too_many_hits')
+            default_governor().on_penalty('fill_search_form')
+            raise RestartRequired("Too many hits", CLEAR_STATE)
+        elif page.state is PageState.ERROR:
+            logging.warning("Fehler from berlin.de, restarting..")
+            self.record('error')
+            raise RestartRequired("Fehler from berlin.de")
+
+        if not page.contains(REMAINING_TIME):
+            self.restart_if_required(page)
+
+        if (page.contains(REMAINING_TIME)
+                and page.contains(PROCEED_BUTTON)
+                and not page.contains(APPOINTMENT_SELECTION)
+                and not event.loader_visible):
+            if self.scheduler.is_expiring():
+                logging.warning("Session about to expire, recycling..")
+                # a fresh session, the captured one would only be replayed with the little time it has left
+                raise RestartRequired("Session about to expire", CLEAR_STATE)
+            if self.submit_gate and not self.submit_gate():
+                # another lane submitted just now, keep the submits staggered
+                return False
+            # back off in hours that historically never released slots
+            pause = self.polling_schedule.interval_at()
+            if pause >= 1:
+                sleep(pause, 'polling_schedule')
+            # the session plan spaces the submits one cycle apart
+            default_clock().sleep(self.scheduler.next_submit_in())
+            self.submit_form("Form Submit.", By.ID, 'applicationForm:managedForm:proceed', page)
+            self._awaiting_response = True
+        return False
+
+    def act_on_response(self, timeout=None):
+        """
+        Acts on the submit answer as soon as it arrived: restarts on rejections and reports a time selection
+        right away. Everything else is left to the DOM path, which also keeps the session bookkeeping.
+        """
+        timeout = response_timeout if timeout is None else min(timeout, response_timeout)
+        response = self.detector.wait_for_response(timeout)
+        if response is None:
+            return False
+        if response.state is PageState.TOO_MANY_HITS:
+            logging.warning("Too many hits, restarting..")
+            self.record('too_many_hits')
+            default_governor().on_penalty('fill_search_form')
+            raise RestartRequired("Too many hits", CLEAR_STATE)
+        if response.state is PageState.ERROR:
+            logging.warning("Fehler from berlin.de, restarting..")
+            self.record('error')
+            raise RestartRequired("Fehler from berlin.de")
+        if response.state is PageState.SUCCESS or response.has_time_selection:
+            self.scheduler.observe_response(response.elapsed)
+            self._awaiting_response = False
+            # the page still renders the answer while the report is prepared
+            if self.is_valid_appointment_time_found():
+                self.report_success()
+                return True
+        return False
 
     def is_loader_not_visible(self):
         try:
             # Wait for the loading overlay to disappear
-            WebDriverWait(self._driver, 30).until(
+            default_clock().wait(self._driver, 30).until(
                 EC.invisibility_of_element_located((By.CLASS_NAME, "loading"))
             )
             return True
         except TimeoutException:
             if self.timeout_count > 5:
-                raise Exception("Restart due to more timeouts")
+                raise RestartRequired("Restart due to more timeouts")
             self.timeout_count = self.timeout_count + 1
             return False
         except Exception:
             return False
 
+    @timed('enter_start_page')
     def enter_start_page(self):
         logging.info("Visit start page")
         self.restart_if_rejected()
-        self.driver.get(page_url)
+        # a recovery already brought the browser here
+        if self.driver.current_url != page_url():
+            default_governor().acquire('enter_start_page')
+            self.driver.get(page_url())
+        record_page_load(self.driver, 'enter_start_page')
         self.driver.minimize_window()
-        self.restart_if_under_maintenance()
-        self.restart_if_rejected()
-        while find_by_xpath(self.driver, "//*[contains(text(),'500 - Internal Server Error')]", 0):
+        page = lea_classifier.snapshot(self.driver)
+        self.restart_if_under_maintenance(page)
+        self.restart_if_rejected(page)
+        if page.state is PageState.SERVER_ERROR:
             logging.error("Page error - 500 - Internal Server Error")
             sleep(1, 'enter_start_page')
+            default_governor().acquire('enter_start_page')
             self.driver.refresh()
+            return "server_error"
         click_by_xpath(self.driver, "Start page", By.XPATH,
                        '//*[@id="mainForm"]/div/div/div/div/div/div/div/div/div/div[1]/div[1]/div[2]/a')
+        return "entered"
 
+    @timed('next_target')
+    def next_target(self):
+        """Sweep mode: selects the next visa type in the form, True when it did."""
+        if len(self._targets) < 2:
+            return False
+        current = self._profile
+        self._profile = self._targets[(self._targets.index(current) + 1) % len(self._targets)]
+        result = switch_visa_type(self.driver, self._profile, current)
+        if not (result and result.get("ok")):
+            raise RestartRequired("Failed to switch visa type to " + self._profile.name)
+        logging.info("Sweep: switched from %s to %s", current.name, self._profile.name)
+        return True
+
+    def success_message(self):
+        if len(self._targets) < 2:
+            return success_message
+        return success_message + " Visa type: " + self._profile.visa_type
+
+    def report_success(self):
+        if not claim_slot(self._profile.key()):
+            # another node books this one, keep searching in a new round
+            raise RestartRequired("Slot already reported by another node")
+        self.record('success')
+        send_success_message(self.driver, bot_name, self.success_message(), handoff=self.handoff)
+
+    @timed('resume_session')
+    def resume_session(self):
+        snapshot = self.snapshots.get(self._name) if self.snapshots.enabled else None
+        if snapshot is None:
+            return False
+        started = time.monotonic()
+        try:
+            default_governor().acquire('resume_session')
+            snapshot.replay(self.driver)
+            page = lea_classifier.snapshot(self.driver)
+            for _ in range(2):
+                if page.contains(MAIN_FORM):
+                    break
+                sleep(1, 'resume_session')
+                page = lea_classifier.snapshot(self.driver)
+        except Exception as ex:
+            self.snapshots.rejected(self._name, ex)
+            return False
+        if not page.contains(MAIN_FORM):
+            self.snapshots.rejected(self._name, page.state.name)
+            self.driver.delete_all_cookies()
+            return False
+        self.snapshots.accepted(time.monotonic() - started, full_path_steps)
+        return True
+
+    def save_session(self):
+        if self._path_started_at is None or not self.snapshots.enabled:
+            return
+        try:
+            self.snapshots.put(self._name, SessionSnapshot.capture(self.driver),
+                               time.monotonic() - self._path_started_at)
+        except Exception as ex:
+            logging.warning("Failed to capture session snapshot, reason= %s", ex)
+        self._path_started_at = None
+
+    @timed('enter_form')
     def enter_form(self):
-        self.wait_for_main_form()
+        self.save_session()
         logging.info("Fill out form")
-        nationality = os.environ.get("LEA_NATIONALITY")
-        num_of_person = os.environ.get("LEA_NUMBER_OF_PERSON")
-        family_living_in_berlin = os.environ.get("LEA_LIVING_IN_BERLIN")
-        family_nationality = os.environ.get("LEA_NATIONALITY_OF_FAMILY_MEMBERS")
-        visa_category = os.environ.get("LEA_VISA_CATEGORY")
-        sub_category = os.environ.get("LEA_VISA_SUB_CATEGORY")
-        visa_type = os.environ.get("LEA_VISA_TYPE")
+        result = fill_form(self.driver, self._profile)
+        if result and result.get("ok"):
+            self.restart_if_required()
+            return "filled"
+        logging.warning("In-page form fill incomplete, falling back to step by step")
+        self.enter_form_step_by_step()
+        return "filled"
+
+    def enter_form_step_by_step(self):
+        nationality = self._profile.nationality
+        num_of_person = self._profile.num_of_person
+        family_living_in_berlin = self._profile.family_living_in_berlin
+        family_nationality = self._profile.family_nationality
+        visa_category = self._profile.visa_category
+        sub_category = self._profile.sub_category
+        visa_type = self._profile.visa_type
 
         try:
             # Citizenship = Indien
@@ -147,130 +384,190 @@ class BerlinBot:
 
             self.restart_if_required()
 
+        except RestartRequired:
+            raise
         except TimeoutException as toe:
             raise Exception("TimeoutException - {0}".format(toe.msg))
         except Exception as exp:
             raise Exception(exp)
 
-    def submit_form(self, element_name, selector_type, selector):
-        if self.is_success():
-            send_success_message(self.driver, bot_name, success_message)
+    @timed('submit_form')
+    def submit_form(self, element_name, selector_type, selector, page=None):
+        if self.is_success(page):
+            self.report_success()
         else:
-            self.print_time_left()
+            logging.info("Session time left: %s sec, attempt # %d, %s more planned", self.scheduler.remaining(),
+                         self.scheduler.attempts + 1, self.scheduler.planned_attempts())
+            default_governor().acquire('submit_form')
+            if self.detector:
+                self.detector.mark()
             click_by_xpath(self.driver, element_name, selector_type, selector)
+            self.scheduler.submitted()
+            self._switched = False
 
     def wait_for_main_form(self):
-        while not is_page_contains_text(self.driver, "Angaben zum Anliegen"):
-            self.restart_if_session_closed()
-            self.restart_if_rejected()
-            sleep(3, 'wait_for_main_form')
-
-    def restart_if_under_maintenance(self):
-        while is_page_contains_text(self.driver, "Wartungsarbeiten"):
+        page = lea_classifier.snapshot(self.driver)
+        if page.contains(MAIN_FORM):
+            return "ready"
+        self.restart_if_session_closed(page)
+        self.restart_if_rejected(page)
+        sleep(3, 'wait_for_main_form')
+        return "waiting"
+
+    def restart_if_under_maintenance(self, page=None):
+        page = page or lea_classifier.snapshot(self.driver)
+        if page.state is PageState.MAINTENANCE:
             sleep(60, 'restart_if_under_maintenance')
-            raise Exception("Site under maintenance")
+            raise RestartRequired("Site under maintenance")
 
-    def is_success(self):
-        return (self.is_loader_not_visible()
-                and is_page_contains_text(self.driver, "Ausgewählte Dienstleistung:")
-                and is_page_contains_text(self.driver, "recaptcha")
+    @timed('is_success')
+    def is_success(self, page=None):
+        page = page or lea_classifier.snapshot(self.driver)
+        return (page.state is PageState.SUCCESS
+                and self.is_loader_not_visible()
                 and self.is_valid_appointment_time_found())
 
+    @timed('tick_off_agreement')
     def tick_off_agreement(self):
         logging.info("Ticking off agreement")
         self.restart_if_rejected()
         click_by_xpath(self.driver, "Select agreement", By.XPATH,
                        '//*[@id="xi-div-1"]/div[4]/label[2]/p')
+        default_governor().acquire('tick_off_agreement')
         click_by_xpath(self.driver, "Submit button", By.ID, 'applicationForm:managedForm:proceed')
+        return "ticked"
 
     def is_visa_extension_button_not_found(self):
         return self.visa_extension_button_count() == 0
 
     def visa_extension_button_count(self):
-        return len(count_by_xpath(self.driver, '//*[contains(text(),"' + os.environ.get("LEA_VISA_CATEGORY") + '")]'))
+        return len(count_by_xpath(self.driver, '//*[contains(text(),"' + self._profile.visa_category + '")]'))
 
-    def restart_if_required(self):
+    def restart_if_required(self, page=None):
         self.restart_if_duplicate_buttons_found()
-        self.restart_if_session_closed()
+        self.restart_if_session_closed(page)
 
     def restart_if_duplicate_buttons_found(self):
         count = self.visa_extension_button_count()
         if count > 3:
             logging.error("Duplicate button found, count=%d, restarting..", count)
-            raise Exception("Duplicate buttons found")
+            raise RestartRequired("Duplicate buttons found")
 
-    def restart_if_session_closed(self):
-        if self.is_session_closed():
+    def restart_if_session_closed(self, page=None):
+        if self.is_session_closed(page):
+            self.record('session_closed')
             send_error_message(self.driver, bot_name, "session closed", 20)
-            raise Exception("Session closed message found")
-
-    def is_error_message(self, message, retry=1):
-        return is_page_contains_text(self.driver, message)
-
-    def close_if_additional_dialog_window_found(self):
-        try:
-            # Wait for the form to be present
-            additional_dialog_found = WebDriverWait(self.driver, 10).until(
-                EC.visibility_of_element_located((By.ID, 'additionalTimeDialog'))
-            )
+            raise RestartRequired("Session closed message found", CLEAR_STATE)
 
-            if additional_dialog_found.is_enabled():
-                logging.warning("Got additional dialog: Session ended. Would you like to extend the session?, "
-                                "retrying..")
-                raise Exception("Got additional dialog: Session ended")
-        except TimeoutException:
-            pass
-        except Exception:
-            raise
+    def close_if_additional_dialog_window_found(self, event):
+        if event.dialog_visible:
+            if self.extend_session():
+                return
+            logging.warning("Got additional dialog: Session ended. Would you like to extend the session?, "
+                            "retrying..")
+            raise RestartRequired("Got additional dialog: Session ended")
 
     @property
     def driver(self):
         return self._driver
 
-    def is_session_closed(self):
-        return (is_page_contains_text(self.driver, "Sitzungsende")
-                or is_page_contains_text(self.driver, "Fehler ist aufgetreten. Bitte versuchen Sie es zu einem "
-                                                      "späteren Zeitpunkt nochmal."))
+    @property
+    def start_url(self):
+        return page_url()
+
+    @property
+    def ready(self):
+        return self._started_at is None
+
+    def run(self):
+        self.find_appointment()
+
+    def restarted(self, tier=None):
+        self._started_at = time.monotonic()
+        self.timeout_count = 0
+        if tier == CLEAR_STATE:
+            # the server turned this session down, a replay would bring it back
+            self.snapshots.invalidate(self._name)
+
+    @property
+    def profile(self):
+        return self._profile
+
+    def is_session_closed(self, page=None):
+        page = page or lea_classifier.snapshot(self.driver)
+        return page.contains(SESSION_END) or page.contains(SESSION_ERROR)
+
+    def record(self, outcome):
+        record_outcome(outcome)
+        record_probe(self._profile.name, outcome)
+
+    def report_restart_time(self):
+        if self._started_at is not None:
+            logging.info("Restart to first form fill: %.2f sec", time.monotonic() - self._started_at)
+            self._started_at = None
 
     def close(self, message):
         logging.exception("Close due to error= {0}".format(message))
         print(traceback.format_exc())
-        self.driver.quit()
+        logging.info("State dwell times: %s", self.machine.summary())
+        record_restart(bot_name)
+        if self._pool:
+            self._pool.release(self.driver)
+        else:
+            self.driver.quit()
 
     def is_valid_appointment_time_found(self):
         try:
             # Wait for the dropdown options to be populated (other than the default option)
-            WebDriverWait(self.driver, 10).until(
-                lambda d: len(d.find_elements(By.CSS_SELECTOR, '#xi-sel-3_1')) > 1
-            )
-
-            select_element = WebDriverWait(self.driver, 10).until(
-                lambda d: d.find_elements(By.CSS_SELECTOR, '#xi-sel-3_1')
-            )
-            time_value = select_element.get_attribute('value')
-            logging.info("FOUND time : %s", time_value)
-            return time_value != ""
+            time_values = default_clock().wait(self.driver, 10).until(lambda d: d.execute_script(
+                "var select = document.getElementById('xi-sel-3_1');"
+                "return select ? Array.prototype.map.call(select.options, function (o) { return o.value; })"
+                ".filter(Boolean) : null;"))
+            logging.info("FOUND time : %s", time_values)
+            return True
+        except TimeoutException:
+            logging.warning("Time selection without times")
+            return False
         except Exception:
             print(traceback.format_exc())
+            return False
 
     def print_time_left(self):
         time_to_wait_in_sec = get_wait_time(self._driver, By.XPATH, "//*[@id='progressBar']")
         logging.info("Session time left: %d sec", time_to_wait_in_sec)
-
-    def restart_if_rejected(self):
-        while is_page_contains_text(self.driver, "The requested URL was rejected. Please consult with your "
-                                                 "administrator"):
+        return time_to_wait_in_sec
+
+    def extend_session(self):
+        # confirm the "extend the session?" dialog in place, without the implicit wait of find_elements
+        extended = accept_extension(self.driver)
+        if extended:
+            sleep(1, 'extend_session')
+            self.scheduler.extended(self.print_time_left())
+        return extended
+
+    def restart_if_rejected(self, page=None):
+        page = page or lea_classifier.snapshot(self.driver)
+        if page.state is PageState.REJECTED:
             sleep(5, 'restart_if_rejected')
-            raise Exception("requested URL was rejected")
+            raise RestartRequired("requested URL was rejected", CLEAR_STATE)
+
+
+def new_bot(pool=None, profile=None, targets=None):
+    tabs = race_tabs()
+    if tabs == 1:
+        return BerlinBot(pool, profile, targets)
+    return TabRacer(lambda driver, lane: BerlinBot(pool, profile, targets, driver, lane), tabs, default_governor())
 
 
 if __name__ == "__main__":
-    while True:
-        berlin_bot = BerlinBot()
-        try:
-            # sys.tracebacklimit = 0
-            load_dotenv()
-            init_logger('LEA')
-            berlin_bot.find_appointment()
-        except BaseException as e:
-            berlin_bot.close(str(e))
+    load_dotenv()
+    init_logger('LEA')
+    start_metrics()
+    default_alarm()  # decode the alarm clip before it is needed
+    browser_pool = BrowserPool(bot_name).start()
+    lea_profile = SearchProfile.from_env()
+    try:
+        Supervisor(bot_name, lambda: new_bot(browser_pool, lea_profile),
+                   lease=default_coordinator().lease(lea_profile.key())).run()
+    finally:
+        browser_pool.shutdown()
@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from common.browser_pool import BrowserPool
+from common.clock import default_clock
+from common.coordination import default_coordinator
+from common.common_util import init_logger
+from common.sound import default_alarm
+from common.metrics import start_metrics
+from common.profile import load_profiles, group_by_applicant
+from common.rate_limit import default_governor
+from common.supervisor import Supervisor
+from lea_berlin_bot import new_bot, bot_name
+
+
+class ProfileRunner(threading.Thread):
+    """
+    Runs the LEA restart loop for one search profile, or one sweep over several, on its own thread and browser.
+
+    A browser session only starts while the runner holds one of the shared slots, so more profiles than
+    LEA_MAX_CONCURRENT_PROFILES take turns between restarts instead of all launching Chrome at once. Cheap
+    recoveries keep the slot for at most `max_hold` seconds (LEA_MAX_SLOT_HOLD, default 900), the next failure
+    after that gives it to the next runner in line; None keeps it until the browser is relaunched.
+    """
+
+    def __init__(self, profiles, pool, slots, max_hold=None):
+        super().__init__(name="+".join(profile.name for profile in profiles), daemon=True)
+        self._profiles = profiles
+        self._slots = slots
+        self._max_hold = max_hold
+        self._lease = default_coordinator().lease("+".join(profile.key() for profile in profiles))
+        self._supervisor = Supervisor(self.name, lambda: new_bot(pool, profiles[0], profiles), lease=self._lease)
+        self.restarts = 0
+
+    def run(self):
+        logging.info("Start profiles %s", self._profiles)
+        while True:
+            # stand by for the lease before taking a slot, a profile run by another node must not pin one here
+            self._lease.acquire()
+            # cheap recoveries keep the slot for a while, a browser relaunch goes back in line
+            with self._slots:
+                self._supervisor.run(until_relaunch=True, hold_for=self._max_hold)
+            self.restarts = self.restarts + 1
+            # give profiles waiting for a slot the chance to take it
+            default_clock().sleep(1)
+
+
+def run_profiles(profiles, max_concurrent, sweep=False):
+    pool = BrowserPool(bot_name).start()
+    slots = threading.BoundedSemaphore(max_concurrent)
+    groups = group_by_applicant(profiles) if sweep else [[profile] for profile in profiles]
+    # only worth handing slots over when some runners have to wait for one
+    max_hold = float(os.environ.get("LEA_MAX_SLOT_HOLD", "900")) if len(groups) > max_concurrent else None
+    runners = [ProfileRunner(group, pool, slots, max_hold) for group in groups]
+    for runner in runners:
+        runner.start()
+    try:
+        while any(runner.is_alive() for runner in runners):
+            time.sleep(60)
+            logging.info("Profiles running=%d, restarts=%s, pool=%s, rate=%.3f/s",
+                         sum(runner.is_alive() for runner in runners),
+                         {runner.name: runner.restarts for runner in runners}, pool.stats(),
+                         default_governor().current_rate())
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    init_logger('LEA', show_thread=True)
+    start_metrics()
+    default_alarm()  # decode the alarm clip before it is needed
+    lea_profiles = load_profiles(os.environ.get("LEA_PROFILES_FILE", "profiles.json"))
+    max_concurrent_profiles = int(os.environ.get("LEA_MAX_CONCURRENT_PROFILES", str(len(lea_profiles))))
+    logging.info("Loaded %d profiles, running at most %d concurrently", len(lea_profiles), max_concurrent_profiles)
+    run_profiles(lea_profiles, max_concurrent_profiles, bool(os.environ.get("LEA_SWEEP")))
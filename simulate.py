@@ -0,0 +1,75 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from common.clock import VirtualClock, set_default_clock
+from common.emulator import EmulatorConfig, start_emulator, apt_start_path
+
+
+class SimulationEnd(Exception):
+    pass
+
+
+def simulate(hours, config):
+    """
+    Runs the APT HTTP probe loop against the emulator on a VirtualClock: every sleep, rate limit wait and
+    polling interval is skipped, so `hours` of polling take seconds. Returns the emulator stats in simulated time.
+    """
+    work_dir = tempfile.mkdtemp(prefix="simulate_")
+    os.environ.update({
+        "RATE_LIMIT_STATE_FILE": os.path.join(work_dir, "rate_limit.json"),
+        "EVENT_STORE_FILE": os.path.join(work_dir, "events.jsonl"),
+        "COORDINATION_URL": "memory://",
+    })
+    # imported late, the module level defaults read the environment above
+    from apartment_berlin_bot import wait_for_slot_over_http
+    from common.rate_limit import default_governor
+
+    clock = VirtualClock()
+    set_default_clock(clock)
+    server = start_emulator(config, clock=clock)
+    url = "http://127.0.0.1:{0}{1}".format(server.server_address[1], apt_start_path)
+
+    def stop():
+        raise SimulationEnd()
+
+    clock.call_later(hours * 3600, stop)
+    started, wall_started = clock.time(), time.monotonic()
+    found_at = None
+    try:
+        wait_for_slot_over_http(url)
+        found_at = clock.time()
+    except SimulationEnd:
+        logging.info("No slot found within %.1f simulated hours", hours)
+    finally:
+        stats = server.state.stats()
+        server.shutdown()
+    stats.update({
+        "simulated_hours": (clock.time() - started) / 3600,
+        "wall_seconds": time.monotonic() - wall_started,
+        "time_to_detect": (found_at - stats["slot_published_at"]) if found_at else None,
+        "rate_limit_penalties": default_governor().penalties,
+        "rate_limit_waited": default_governor().waited,
+    })
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated time run of the APT HTTP probe against the emulator")
+    parser.add_argument("--hours", type=float, default=24.0, help="simulated hours to poll at most")
+    parser.add_argument("--slot-at", type=float, default=12 * 3600.0,
+                        help="simulated seconds until the emulator publishes a slot")
+    parser.add_argument("--p-too-many-hits", type=float, default=0.0)
+    parser.add_argument("--p-server-error", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(message)s')
+
+    emulator_config = EmulatorConfig(latency=0.0, jitter=0.0, slot_at=args.slot_at,
+                                     p_too_many_hits=args.p_too_many_hits, p_server_error=args.p_server_error,
+                                     seed=args.seed)
+    print(json.dumps(simulate(args.hours, emulator_config)))
@@ -0,0 +1,44 @@
+import os
+from datetime import date
+
+import pytest
+
+from common.calendar_index import DatePreferences, parse_date, preferences_from_env
+from common.fixture_server import start_fixture_server
+from common.http_probe import CalendarProbe
+
+fixtures = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "apartment")
+
+
+@pytest.fixture
+def calendar_dates():
+    server = start_fixture_server(os.path.join(fixtures, "available"))
+    probe = CalendarProbe("http://127.0.0.1:{0}/dienstleistung/120686/".format(server.server_address[1]))
+    yield probe.probe().dates
+    probe.close()
+    server.shutdown()
+
+
+def test_date_windows_filter_the_calendar(calendar_dates, monkeypatch):
+    monkeypatch.setenv("APT_DATE_WINDOWS", "03.07.2024-05.07.2024,08.07.2024")
+    monkeypatch.delenv("APT_WEEKDAYS", raising=False)
+    monkeypatch.delenv("APT_BLACKOUT_DATES", raising=False)
+    preferences = preferences_from_env()
+    matching = [d.date.date() for d in calendar_dates if preferences.matches(d.date)]
+    assert matching == [date(2024, 7, 4), date(2024, 7, 8)]
+
+
+def test_weekdays_and_blackout_dates(calendar_dates):
+    # 02.07.2024 is a tuesday, 04.07.2024 a thursday and 08.07.2024 a monday
+    preferences = DatePreferences([(parse_date("01.07.2024"), parse_date("31.07.2024"))], weekdays=[0, 1],
+                                  blackout_dates=[parse_date("02.07.2024")])
+    assert [d.date.date() for d in calendar_dates if preferences.matches(d.date)] == [date(2024, 7, 8)]
+
+
+def test_overlapping_windows_are_merged_and_best_is_the_earliest():
+    preferences = DatePreferences([(date(2024, 7, 10), date(2024, 7, 20)), (date(2024, 7, 1), date(2024, 7, 10)),
+                                   (date(2024, 7, 21), date(2024, 7, 22))])
+    assert "01.07.2024-22.07.2024" in repr(preferences)
+    slots = [{"day": date(2024, 7, 23)}, {"day": date(2024, 7, 15)}, {"day": date(2024, 7, 3)}]
+    assert preferences.best(slots) == {"day": date(2024, 7, 3)}
+    assert preferences.best([{"day": date(2024, 6, 30)}]) is None
@@ -0,0 +1,35 @@
+import time
+
+from common.dispatcher import NotificationDispatcher
+
+
+class ListSink:
+    name = "list"
+
+    def __init__(self):
+        self.received = []
+
+    def send(self, notification):
+        self.received.append(notification.key)
+
+
+def test_duplicates_within_the_window_are_dropped():
+    sink = ListSink()
+    dispatcher = NotificationDispatcher([sink], dedup_window=60)
+    assert dispatcher.notify("slot found", key="LEA")
+    assert not dispatcher.notify("slot found again", key="LEA")
+    assert dispatcher.notify("slot found", key="APT")
+    assert dispatcher.join(timeout=5)
+    assert sink.received == ["LEA", "APT"]
+
+
+def test_keys_are_sent_again_and_pruned_after_the_window():
+    sink = ListSink()
+    dispatcher = NotificationDispatcher([sink], dedup_window=0.05)
+    for key in ("a", "b", "c"):
+        dispatcher.notify("message", key=key)
+    time.sleep(0.1)
+    assert dispatcher.notify("message", key="a")
+    assert list(dispatcher._recent) == ["a"]
+    assert dispatcher.join(timeout=5)
+    assert sink.received == ["a", "b", "c", "a"]
@@ -0,0 +1,50 @@
+import os
+from datetime import date
+
+import pytest
+
+from common.fixture_server import start_fixture_server
+from common.http_probe import CalendarProbe
+from common.page_state import PageState
+
+fixtures = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "apartment")
+
+
+@pytest.fixture
+def probe_of():
+    servers, probes = [], []
+
+    def probe_of(name):
+        server = start_fixture_server(os.path.join(fixtures, name))
+        servers.append(server)
+        probes.append(CalendarProbe("http://127.0.0.1:{0}/dienstleistung/120686/".format(server.server_address[1])))
+        return probes[-1]
+
+    yield probe_of
+    for probe in probes:
+        probe.close()
+    for server in servers:
+        server.shutdown()
+
+
+def test_bookable_days_of_the_calendar(probe_of):
+    result = probe_of("available").probe()
+    assert result.state is PageState.SUCCESS
+    assert [d.date.date() for d in result.dates] == [date(2024, 7, 2), date(2024, 7, 4), date(2024, 7, 8)]
+    assert all(d.href.endswith("/") and "/terminvereinbarung/termin/time/" in d.href for d in result.dates)
+
+
+def test_unchanged_calendar_is_not_modified(probe_of):
+    probe = probe_of("available")
+    first = probe.probe()
+    second = probe.probe()
+    assert second.not_modified
+    assert second.dates == first.dates
+
+
+@pytest.mark.parametrize("name, state", [("no_appointments", PageState.NO_APPOINTMENTS),
+                                         ("too_many_hits", PageState.TOO_MANY_HITS)])
+def test_calendar_without_bookable_days(probe_of, name, state):
+    result = probe_of(name).probe()
+    assert result.state is state
+    assert result.dates == []
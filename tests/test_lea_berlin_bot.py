@@ -0,0 +1,139 @@
+import pytest
+
+import lea_berlin_bot
+from common.dom_waiter import PageEvent
+from common.page_state import lea_classifier
+from common.profile import SearchProfile
+from common.session_scheduler import SessionScheduler
+from common.supervisor import RestartRequired, CLEAR_STATE
+from lea_berlin_bot import BerlinBot
+
+form_ready = 'Verbleibende Zeit: 14:59 <button id="applicationForm:managedForm:proceed">Weiter</button>'
+
+
+class FakeGovernor:
+    def acquire(self, context=''):
+        return 0.0
+
+    def on_success(self):
+        pass
+
+    def on_penalty(self, context=''):
+        pass
+
+    def current_rate(self):
+        # submits are spaced one cycle of the shared rate apart, fast enough for a test
+        return 1000.0
+
+
+class FakeWaiter:
+    def wait_for_change(self, timeout=None):
+        return PageEvent({"changed": True})
+
+
+class FakeSnapshots:
+    enabled = True
+
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, name):
+        self.invalidated.append(name)
+
+
+class FakeSchedule:
+    def interval_at(self):
+        return 0
+
+
+class Pages:
+    """Serves page sources to the bot in order, the last one stays."""
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+
+    def snapshot(self, driver):
+        source = self.sources.pop(0) if len(self.sources) > 1 else self.sources[0]
+        return lea_classifier.classify(source)
+
+
+def profile(name):
+    return SearchProfile(name, "Indien", "1", "nein", "", "Aufenthaltstitel - verlängern", "",
+                         "Visa type " + name)
+
+
+@pytest.fixture
+def make_bot(monkeypatch):
+    clicks = []
+    monkeypatch.setattr(lea_berlin_bot, "default_governor", FakeGovernor)
+    monkeypatch.setattr(lea_berlin_bot, "handle_unexpected_alert", lambda driver, timeout: None)
+    monkeypatch.setattr(lea_berlin_bot, "click_by_xpath", lambda driver, name, *args: clicks.append(name))
+
+    def make_bot(sources, targets=None):
+        monkeypatch.setattr(lea_berlin_bot, "lea_classifier", Pages(sources))
+        bot = BerlinBot.__new__(BerlinBot)
+        bot._targets = targets or [profile("a")]
+        bot._profile = bot._targets[0]
+        bot._name = "+".join(target.name for target in bot._targets)
+        bot._driver = None
+        bot._started_at = None
+        bot._awaiting_response = False
+        bot._switched = False
+        bot.timeout_count = 0
+        bot.submit_gate = None
+        bot.detector = None
+        bot.waiter = FakeWaiter()
+        bot.scheduler = SessionScheduler(FakeGovernor())
+        bot.scheduler.start_session(900)
+        bot.polling_schedule = FakeSchedule()
+        bot.snapshots = FakeSnapshots()
+        bot.handoff = None
+        bot.record = lambda outcome: None
+        bot.clicks = clicks
+        return bot
+
+    return make_bot
+
+
+def test_form_is_submitted(make_bot):
+    bot = make_bot([form_ready])
+    assert not bot.poll()
+    assert bot.clicks == ["Form Submit."]
+    assert bot.scheduler.attempts == 1
+
+
+def test_expiring_session_is_recycled_without_its_snapshot(make_bot):
+    bot = make_bot([form_ready])
+    bot.scheduler.start_session(3)
+    with pytest.raises(RestartRequired) as raised:
+        bot.poll()
+    assert raised.value.tier == CLEAR_STATE
+    assert bot.clicks == []
+    bot.restarted(raised.value.tier)
+    assert bot.snapshots.invalidated == ["a"]
+
+
+def test_sweep_submits_each_visa_type_once(make_bot, monkeypatch):
+    switches = []
+    monkeypatch.setattr(lea_berlin_bot, "switch_visa_type",
+                        lambda driver, target, current: switches.append(target.name) or {"ok": True})
+    # the "keine Termine frei" answer stays on the form until the next submit replaces it
+    no_appointments = form_ready + "<li>Für die gewählte Dienstleistung sind aktuell keine Termine frei!</li>"
+    bot = make_bot([no_appointments], targets=[profile("a"), profile("b")])
+    for _ in range(6):
+        assert not bot.poll()
+    assert switches == ["b", "a", "b"]
+    assert bot.clicks == ["Form Submit."] * 3
+
+
+def test_slot_reported_by_another_node_is_not_a_success(make_bot, monkeypatch):
+    recorded, notified = [], []
+    monkeypatch.setattr(lea_berlin_bot, "claim_slot", lambda claim: False)
+    monkeypatch.setattr(lea_berlin_bot, "send_success_message", lambda *args, **kwargs: notified.append(args))
+    bot = make_bot(['<h2>Auswahl Termin</h2><p>Ausgewählte Dienstleistung: X</p><div class="g-recaptcha"></div>'])
+    bot.is_success = lambda page=None: True
+    bot.record = recorded.append
+    with pytest.raises(RestartRequired):
+        bot.poll()
+    assert recorded == []
+    assert notified == []
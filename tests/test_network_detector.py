@@ -0,0 +1,90 @@
+import json
+
+from common.network_detector import NetworkDetector
+from common.page_state import PageState, lea_classifier
+
+submit_url = "https://otv.verwalt-berlin.de/ams/TerminBuchen/wizardng/submit"
+no_appointments = {"html": "<ul><li>Für die gewählte Dienstleistung sind aktuell keine Termine frei! "
+                           "Bitte versuchen Sie es zu einem späteren Zeitpunkt erneut.</li></ul>"}
+time_selection = {"replace": True, "html": '<h2>Auswahl Termin</h2><p>Ausgewählte Dienstleistung: X</p>'
+                                           '<select id="xi-sel-3_1" name="time"><option value="09:00">09:00</option>'
+                                           '</select><div class="g-recaptcha" data-sitekey="recaptcha"></div>'}
+
+
+class FakeDriver:
+    """Performance log and response bodies as chromedriver hands them out, for one browser with tabs."""
+
+    def __init__(self):
+        self.current_window_handle = "CDwindow-TAB1"
+        self.log = []
+        self.bodies = {}
+
+    def get_log(self, log_type):
+        entries, self.log = self.log, []
+        return entries
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {"body": json.dumps(self.bodies[params["requestId"]]), "base64Encoded": False}
+
+    def event(self, method, params, tab="tab1", timestamp=0.0):
+        self.log.append({"message": json.dumps({"webview": tab, "message": {"method": method, "params": params}}),
+                         "timestamp": timestamp})
+
+    def answer(self, request_id, body, http_method="POST", tab="tab1"):
+        self.bodies[request_id] = body
+        self.event("Network.requestWillBeSent",
+                   {"requestId": request_id, "request": {"method": http_method, "url": submit_url}}, tab)
+        self.event("Network.responseReceived",
+                   {"requestId": request_id, "response": {"mimeType": "application/json"}}, tab)
+        self.event("Network.loadingFinished", {"requestId": request_id}, tab)
+
+
+def detector(driver):
+    network_detector = NetworkDetector(driver, lea_classifier, url_part="/ams/TerminBuchen", poll_interval=0.01)
+    network_detector.mark()
+    return network_detector
+
+
+def test_no_appointments_answer():
+    driver = FakeDriver()
+    network_detector = detector(driver)
+    driver.answer("1", no_appointments)
+    event = network_detector.wait_for_response(1)
+    assert event.state is PageState.NO_APPOINTMENTS
+    assert not event.has_time_selection
+
+
+def test_time_selection_answer():
+    driver = FakeDriver()
+    network_detector = detector(driver)
+    driver.answer("1", time_selection)
+    event = network_detector.wait_for_response(1)
+    assert event.state is PageState.SUCCESS
+    assert event.has_time_selection
+
+
+def test_failed_request_hands_over_as_unknown():
+    driver = FakeDriver()
+    network_detector = detector(driver)
+    driver.event("Network.requestWillBeSent", {"requestId": "1", "request": {"method": "POST", "url": submit_url}})
+    driver.event("Network.loadingFailed", {"requestId": "1"})
+    assert network_detector.wait_for_response(1).state is PageState.UNKNOWN
+
+
+def test_unrelated_traffic_is_ignored():
+    driver = FakeDriver()
+    network_detector = detector(driver)
+    driver.answer("1", time_selection, http_method="GET")
+    assert network_detector.wait_for_response(0.05) is None
+
+
+def test_answers_stay_with_the_tab_that_submitted():
+    driver = FakeDriver()
+    first = detector(driver)
+    driver.current_window_handle = "CDwindow-TAB2"
+    second = detector(driver)
+    driver.answer("1", no_appointments, tab="tab2")
+    driver.answer("2", time_selection, tab="tab1")
+    assert second.wait_for_response(1).state is PageState.NO_APPOINTMENTS
+    driver.current_window_handle = "CDwindow-TAB1"
+    assert first.wait_for_response(1).state is PageState.SUCCESS
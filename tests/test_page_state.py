@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from common.page_state import PageState, MultiPatternMatcher, apartment_classifier, lea_classifier
+
+fixtures = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "apartment")
+
+
+def read_fixture(name):
+    with open(os.path.join(fixtures, name, "terminvereinbarung", "termin", "all", "120686.html"),
+              encoding="utf-8") as f:
+        return f.read()
+
+
+def test_nested_markers_are_found_in_one_scan():
+    matcher = MultiPatternMatcher(["Fehler", "Bitte entschuldigen Sie den Fehler", "keine Termine"])
+    assert matcher.find_all("Bitte entschuldigen Sie den Fehler") == {"Fehler", "Bitte entschuldigen Sie den Fehler"}
+    assert matcher.find_all("nichts") == frozenset()
+
+
+@pytest.mark.parametrize("name, state", [
+    ("available", PageState.SUCCESS),
+    ("no_appointments", PageState.NO_APPOINTMENTS),
+    ("too_many_hits", PageState.TOO_MANY_HITS),
+])
+def test_apartment_calendar_fixtures(name, state):
+    assert apartment_classifier.classify(read_fixture(name)).state is state
+
+
+@pytest.mark.parametrize("source, state", [
+    ("<ul><li>Für die gewählte Dienstleistung sind aktuell keine Termine frei! "
+     "Bitte versuchen Sie es zu einem späteren Zeitpunkt erneut.</li></ul>", PageState.NO_APPOINTMENTS),
+    ("<ul><li>Zu viele Zugriffe. Bitte versuchen Sie es später.</li></ul>", PageState.TOO_MANY_HITS),
+    ("<ul><li>Es ist ein Fehler aufgetreten.</li></ul>", PageState.ERROR),
+    ("<h1>Sitzungsende</h1>", PageState.SESSION_CLOSED),
+    ("<h2>Auswahl Termin</h2><p>Ausgewählte Dienstleistung: X</p><div class=\"g-recaptcha\"></div>", PageState.SUCCESS),
+    ("Verbleibende Zeit: 14:59 <button id=\"applicationForm:managedForm:proceed\">Weiter</button>",
+     PageState.FORM_READY),
+    ("", PageState.UNKNOWN),
+])
+def test_lea_answers(source, state):
+    assert lea_classifier.classify(source).state is state
+
+
+def test_unreadable_page_is_unknown():
+    class BrokenDriver:
+        @property
+        def page_source(self):
+            raise Exception("no such window")
+
+    assert lea_classifier.snapshot(BrokenDriver()).state is PageState.UNKNOWN
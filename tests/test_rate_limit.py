@@ -0,0 +1,48 @@
+import pytest
+
+from common.clock import VirtualClock, set_default_clock
+from common.rate_limit import RateLimitGovernor
+
+
+@pytest.fixture
+def clock():
+    virtual_clock = VirtualClock(start=1000.0)
+    previous = set_default_clock(virtual_clock)
+    yield virtual_clock
+    set_default_clock(previous)
+
+
+@pytest.fixture
+def governor(tmp_path, clock):
+    return RateLimitGovernor(str(tmp_path / "rate_limit.json"), initial_rate=0.5, max_rate=0.6, burst=3,
+                             increase=0.05, decrease=0.5, cooldown=60.0, jitter=0.0)
+
+
+def test_burst_then_one_token_per_interval(governor, clock):
+    assert [governor.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert governor.acquire() == pytest.approx(2.0)
+    assert clock.time() == pytest.approx(1002.0)
+
+
+def test_additive_increase_up_to_the_max_rate(governor):
+    governor.on_success()
+    assert governor.current_rate() == pytest.approx(0.55)
+    for _ in range(5):
+        governor.on_success()
+    assert governor.current_rate() == pytest.approx(0.6)
+
+
+def test_penalty_halves_the_rate_and_cools_down(governor, clock):
+    governor.on_penalty()
+    assert governor.current_rate() == pytest.approx(0.25)
+    assert governor.penalties == 1
+    assert governor.acquire() == pytest.approx(60.0)
+    assert clock.time() == pytest.approx(1060.0)
+    # the bucket refilled during the cooldown, past the burst tokens come at the halved rate
+    assert [governor.acquire() for _ in range(3)] == pytest.approx([0.0, 0.0, 4.0])
+
+
+def test_state_is_shared_through_the_file(governor, tmp_path):
+    governor.on_penalty()
+    other = RateLimitGovernor(str(tmp_path / "rate_limit.json"), initial_rate=0.5, jitter=0.0)
+    assert other.current_rate() == pytest.approx(0.25)
@@ -0,0 +1,39 @@
+import pytest
+
+from common.session_scheduler import SessionScheduler
+
+
+class FakeGovernor:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def current_rate(self):
+        return self.rate
+
+
+def test_plan_follows_the_rate_and_the_response_time():
+    scheduler = SessionScheduler(FakeGovernor(0.5))
+    scheduler.start_session(106)
+    assert scheduler.planned_attempts() == 50
+    scheduler.observe_response(4.0)
+    assert scheduler.planned_attempts() == 25
+
+
+def test_submits_are_spaced_one_cycle_apart():
+    scheduler = SessionScheduler(FakeGovernor(0.5))
+    scheduler.start_session(900)
+    assert scheduler.next_submit_in() == 0.0
+    scheduler.submitted()
+    assert scheduler.next_submit_in() == pytest.approx(2.0, abs=0.1)
+    scheduler.start_session(900)
+    assert scheduler.next_submit_in() == 0.0
+
+
+def test_expiring_once_another_answer_would_not_fit():
+    scheduler = SessionScheduler(FakeGovernor(0.5))
+    assert not scheduler.is_expiring()
+    scheduler.start_session(900)
+    assert not scheduler.is_expiring()
+    scheduler.observe_response(10.0)
+    scheduler.start_session(12)
+    assert scheduler.is_expiring()
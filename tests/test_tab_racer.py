@@ -0,0 +1,59 @@
+from common.supervisor import RestartRequired
+from common.tab_racer import TabRacer
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver.current_window_handle = handle
+
+
+class FakeDriver:
+    def __init__(self):
+        self.window_handles = ["lead"]
+        self.current_window_handle = "lead"
+        self.switch_to = FakeSwitchTo(self)
+
+
+class FakeScheduler:
+    response_time = None
+
+    def end_session(self):
+        pass
+
+
+class FakeGovernor:
+    def current_rate(self):
+        return 1.0
+
+
+class Lane:
+    """A bot whose polls play back `outcomes`: True finds a slot, an exception is raised."""
+
+    def __init__(self, driver, outcomes):
+        self.driver = driver
+        self.window = "lead"
+        self.scheduler = FakeScheduler()
+        self.submit_gate = None
+        self.start_url = "about:blank"
+        self.sessions = 0
+        self._outcomes = list(outcomes)
+
+    def prepare_session(self):
+        self.sessions = self.sessions + 1
+
+    def poll(self, timeout=None):
+        outcome = self._outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_lost_claim_restarts_the_lane_and_the_race_goes_on():
+    lane = Lane(FakeDriver(), [False, RestartRequired("Slot already reported by another node"), False, True])
+    racer = TabRacer(lambda driver, index: lane, 1, FakeGovernor())
+    racer.run()
+    assert lane.sessions == 2
+    assert lane._outcomes == []